@@ -4,23 +4,30 @@ idotmatrix.
 Library to configure any iDotMatrix compatible 16x16 or 32x32 pixel display without the chinese iDotMatrix android / iOS app.
 """
 
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
 from .version import __version__
-from idotmatrix import logger
-from idotmatrix.connectionManager import ConnectionManager
-from .modules.clock import Clock
-from .modules.chronograph import Chronograph
-from .modules.common import Common
-from .modules.countdown import Countdown
-from .modules.eco import Eco
-from .modules.fullscreenColor import FullscreenColor
-from .modules.gif import Gif
-from .modules.graffiti import Graffiti
-from .modules.image import Image
-from .modules.musicSync import MusicSync
-from .modules.scoreboard import Scoreboard
-from .modules.system import System
-from .modules.text import Text
-from .modules.effect import Effect
+from .logger import configureLogging
+
+if TYPE_CHECKING:
+    from .connectionManager import ConnectionManager
+    from .connectionPool import ConnectionPool
+    from .transports import BleakTransport, SimulatedTransport, Transport
+    from .modules.clock import Clock
+    from .modules.chronograph import Chronograph
+    from .modules.common import Common
+    from .modules.countdown import Countdown
+    from .modules.eco import Eco
+    from .modules.fullscreenColor import FullscreenColor
+    from .modules.gif import Gif
+    from .modules.graffiti import Graffiti
+    from .modules.image import Image
+    from .modules.musicSync import MusicSync
+    from .modules.scoreboard import Scoreboard
+    from .modules.system import System
+    from .modules.text import Text
+    from .modules.effect import Effect
 
 
 __author__ = "Kalle Minkner, Jon-Mailes Graeffe"
@@ -28,7 +35,12 @@ __credits__ = (
     "everyone who thankfully helped with the reverse-engineering. You are awesome!"
 )
 __all__ = [
+    "configureLogging",
     "ConnectionManager",
+    "ConnectionPool",
+    "Transport",
+    "BleakTransport",
+    "SimulatedTransport",
     "Clock",
     "Chronograph",
     "Common",
@@ -44,3 +56,60 @@ __all__ = [
     "Text",
     "Effect",
 ]
+
+# public names are imported on first access, so e.g. "from idotmatrix import Common" neither
+# loads Pillow nor cryptography
+_lazy = {
+    "ConnectionManager": ".connectionManager",
+    "ConnectionPool": ".connectionPool",
+    "Transport": ".transports",
+    "BleakTransport": ".transports",
+    "SimulatedTransport": ".transports",
+    "Clock": ".modules.clock",
+    "Chronograph": ".modules.chronograph",
+    "Common": ".modules.common",
+    "Countdown": ".modules.countdown",
+    "Eco": ".modules.eco",
+    "FullscreenColor": ".modules.fullscreenColor",
+    "Gif": ".modules.gif",
+    "Graffiti": ".modules.graffiti",
+    "Image": ".modules.image",
+    "MusicSync": ".modules.musicSync",
+    "Scoreboard": ".modules.scoreboard",
+    "System": ".modules.system",
+    "Text": ".modules.text",
+    "Effect": ".modules.effect",
+}
+_submodules = {
+    "bitmapFont",
+    "connectionManager",
+    "connectionPool",
+    "const",
+    "emulator",
+    "glyphAtlas",
+    "glyphCache",
+    "metrics",
+    "modules",
+    "payloadCache",
+    "recorder",
+    "tokenBucket",
+    "tracing",
+    "transferSession",
+    "transports",
+    "writeQueue",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy:
+        value = getattr(import_module(_lazy[name], __name__), name)
+    elif name in _submodules:
+        value = import_module(f".{name}", __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__) | _submodules)
@@ -0,0 +1,214 @@
+from functools import lru_cache
+import gzip
+import os
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Tuple
+
+# reverses the bit order of a byte (BDF rows are MSB first, the device wants LSB first)
+_REVERSE = bytes(int(f"{i:08b}"[::-1], 2) for i in range(256))
+# file extensions which are loaded as bitmap fonts by Text
+EXTENSIONS = (".bdf", ".pcf", ".bdf.gz", ".pcf.gz")
+
+
+class Glyph(NamedTuple):
+    """A glyph of a bitmap font. Bit i of a row is the pixel in column i (LSB first)."""
+
+    advance: int
+    width: int
+    height: int
+    x_offset: int
+    # offset of the bottom row from the baseline (positive is above the baseline)
+    y_offset: int
+    rows: Tuple[int, ...]
+
+
+def isBitmapFont(font_path: Optional[str]) -> bool:
+    return bool(font_path) and font_path.lower().endswith(EXTENSIONS)
+
+
+class BitmapFont:
+    """BDF or PCF bitmap font, parsed once into packed glyph rows.
+
+    Cells are composed from the glyph rows with integer shifts, so no rasterization is needed and
+    the pixels of the font are kept exactly. BDF files are parsed completely (all Unicode
+    characters); PCF files are read with Pillow, which only loads the first 256 characters.
+    """
+
+    def __init__(self, font_path: str) -> None:
+        """Loads the font.
+
+        Args:
+            font_path (str): path to a .bdf or .pcf file (optionally gzip compressed)
+        """
+        self.path = font_path
+        self.glyphs: Dict[int, Glyph] = {}
+        self.ascent: int = 0
+        self.descent: int = 0
+        self.default_char: Optional[int] = None
+        opener = gzip.open if font_path.lower().endswith(".gz") else open
+        with opener(font_path, "rb") as file:
+            if ".pcf" in font_path.lower():
+                self._loadPCF(file)
+            else:
+                self._loadBDF(file)
+        # packed cells per (character, cell width, cell height)
+        self._cells: Dict[Tuple[str, int, int], bytes] = {}
+
+    def _loadBDF(self, file: BinaryIO) -> None:
+        bounding_box = (0, 0, 0, 0)
+        glyph: Dict[str, object] = {}
+        bitmap: Optional[List[int]] = None
+        for raw in file:
+            line = raw.decode("latin-1").strip()
+            if not line:
+                continue
+            keyword, _, value = line.partition(" ")
+            if bitmap is not None and keyword != "ENDCHAR":
+                row = bytes.fromhex(line).translate(_REVERSE)
+                bitmap.append(int.from_bytes(row, byteorder="little"))
+            elif keyword == "FONTBOUNDINGBOX":
+                bounding_box = tuple(int(v) for v in value.split())
+            elif keyword == "FONT_ASCENT":
+                self.ascent = int(value)
+            elif keyword == "FONT_DESCENT":
+                self.descent = int(value)
+            elif keyword == "DEFAULT_CHAR":
+                self.default_char = int(value)
+            elif keyword == "STARTCHAR":
+                glyph = {}
+            elif keyword == "ENCODING":
+                glyph["encoding"] = int(value.split()[0])
+            elif keyword == "DWIDTH":
+                glyph["advance"] = int(value.split()[0])
+            elif keyword == "BBX":
+                glyph["bbx"] = tuple(int(v) for v in value.split())
+            elif keyword == "BITMAP":
+                bitmap = []
+            elif keyword == "ENDCHAR":
+                encoding = glyph.get("encoding", -1)
+                width, height, x_offset, y_offset = glyph.get("bbx", bounding_box)
+                if encoding >= 0:
+                    self.glyphs[encoding] = Glyph(
+                        glyph.get("advance", width),
+                        width,
+                        height,
+                        x_offset,
+                        y_offset,
+                        tuple(bitmap or ()),
+                    )
+                bitmap = None
+        if not self.ascent and not self.descent:
+            _, height, _, y_offset = bounding_box
+            self.ascent, self.descent = height + y_offset, -y_offset
+
+    def _loadPCF(self, file: BinaryIO) -> None:
+        from PIL.PcfFontFile import PcfFontFile
+
+        font = PcfFontFile(file)
+        for encoding, glyph in enumerate(font.glyph):
+            if not glyph:
+                continue
+            (advance, _), (x0, y0, _, y1), (_, _, width, height), image = glyph
+            row_bytes = (width + 7) // 8
+            packed = image.tobytes("raw", "1;R") if width and height else b""
+            rows = tuple(
+                int.from_bytes(packed[i : i + row_bytes], "little")
+                for i in range(0, len(packed), row_bytes)
+            )
+            # Pillow measures y downwards from the baseline
+            self.glyphs[encoding] = Glyph(advance, width, height, x0, -y1, rows)
+            self.ascent = max(self.ascent, -y0)
+            self.descent = max(self.descent, y1)
+
+    def glyph(self, char: str) -> Optional[Glyph]:
+        """Returns the glyph of a character, the default character of the font or None."""
+        glyph = self.glyphs.get(ord(char))
+        if glyph is None and self.default_char is not None:
+            glyph = self.glyphs.get(self.default_char)
+        return glyph
+
+    def _baseline(self, height: int) -> int:
+        return (height - (self.ascent + self.descent)) // 2 + self.ascent
+
+    def _place(self, rows: List[int], glyph: Glyph, x: int, baseline: int) -> None:
+        top = baseline - glyph.y_offset - glyph.height
+        x += glyph.x_offset
+        for i, row in enumerate(glyph.rows):
+            y = top + i
+            if 0 <= y < len(rows):
+                rows[y] |= row << x if x >= 0 else row >> -x
+
+    @staticmethod
+    def _pack(rows: List[int], x: int, width: int) -> bytes:
+        mask = (1 << width) - 1
+        row_bytes = (width + 7) // 8
+        return b"".join(
+            ((row >> x) & mask).to_bytes(row_bytes, byteorder="little") for row in rows
+        )
+
+    def cell(self, char: str, width: int, height: int) -> bytes:
+        """Returns the packed bitmap of a character centered into a cell.
+
+        Args:
+            char (str): character
+            width (int): width of the cell in pixels
+            height (int): height of the cell in pixels
+
+        Returns:
+            bytes: packed rows, each padded to full bytes (empty cell if the font lacks the character)
+        """
+        key = (char, width, height)
+        bitmap = self._cells.get(key)
+        if bitmap is None:
+            rows = [0] * height
+            glyph = self.glyph(char)
+            if glyph:
+                self._place(rows, glyph, (width - glyph.advance) // 2, self._baseline(height))
+            bitmap = self._cells[key] = self._pack(rows, 0, width)
+        return bitmap
+
+    def renderStrip(
+        self, text: str, width: int, height: int, proportional: bool = True
+    ) -> List[bytes]:
+        """Lays out a whole string and slices it into packed cells (see glyphCache.renderStrip()).
+
+        Args:
+            text (str): string to draw
+            width (int): width of a cell in pixels
+            height (int): height of a cell in pixels
+            proportional (bool): use the advances of the glyphs instead of one cell per character. Defaults to True.
+
+        Returns:
+            List[bytes]: packed bitmaps of the cells from left to right
+        """
+        if not text:
+            return []
+        if not proportional:
+            return [self.cell(char, width, height) for char in text]
+        glyphs = [self.glyph(char) for char in text]
+        text_width = sum(glyph.advance for glyph in glyphs if glyph)
+        cells = max(1, -(-text_width // width))
+        rows = [0] * height
+        baseline = self._baseline(height)
+        x = (cells * width - text_width) // 2
+        for glyph in glyphs:
+            if glyph:
+                self._place(rows, glyph, x, baseline)
+                x += glyph.advance
+        return [self._pack(rows, i * width, width) for i in range(cells)]
+
+
+@lru_cache(maxsize=16)
+def _loadBitmapFont(font_path: str) -> BitmapFont:
+    return BitmapFont(font_path)
+
+
+def loadBitmapFont(font_path: str) -> BitmapFont:
+    """Loads a BDF or PCF font once per process.
+
+    Args:
+        font_path (str): path to the font file
+
+    Returns:
+        BitmapFont: parsed font (shared)
+    """
+    return _loadBitmapFont(os.path.abspath(font_path))
@@ -1,8 +1,23 @@
-from bleak import BleakClient, BleakScanner, AdvertisementData
-from .const import UUID_READ_DATA, UUID_WRITE_DATA, BLUETOOTH_DEVICE_NAME
+from bleak import BleakClient
+from . import metrics
+from .recorder import Recorder
+from .tokenBucket import TokenBucket
+from . import tracing
+from .transports import BleakTransport, Transport
+from .writeQueue import PRIORITY_BULK, WriteQueue, WriteRequest, commandKind
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import logging
+import random
 import time
-from typing import List, Optional
+from typing import AsyncIterator, Deque, Dict, Iterable, List, Optional
+from collections import deque
+
+# packets collected by ConnectionManager.batch(), per connection and per asyncio task
+_batches: ContextVar[Optional[Dict[int, List[bytes]]]] = ContextVar(
+    "idotmatrix_batches", default=None
+)
 
 
 class SingletonMeta(type):
@@ -10,6 +25,9 @@ class SingletonMeta(type):
     _instances: dict = {}
 
     def __call__(cls, *args, **kwargs) -> "SingletonMeta":
+        if args or kwargs:
+            # instances bound to a specific device (e.g. by the ConnectionPool) are not shared
+            return super().__call__(*args, **kwargs)
         if cls not in cls._instances:
             try:
                 instance = super().__call__(*args, **kwargs)
@@ -23,24 +41,75 @@ class SingletonMeta(type):
 class ConnectionManager(metaclass=SingletonMeta):
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.address: Optional[str] = None
-        self.client: Optional[BleakClient] = None
+    def __init__(
+        self, address: Optional[str] = None, transport: Optional[Transport] = None
+    ) -> None:
+        """Initializes the connection.
+
+        Args:
+            address (Optional[str]): address of the device. Defaults to None (set later or connectBySearch()).
+            transport (Optional[Transport]): link to the device. Defaults to None (a BleakTransport is created on connect).
+        """
+        self.address: Optional[str] = transport.address if transport else address
+        self.transport: Optional[Transport] = None
+        if transport:
+            self.setTransport(transport)
+        # minimum gap in seconds between two consecutive send() calls
+        self.write_gap: float = 0.01
+        # optional throughput limit of the link
+        self.bucket: Optional[TokenBucket] = None
+        self._last_write: float = 0.0
+        # amount of write-without-response packets which may be in flight during sendPayloads()
+        self.pipeline_window: int = 8
+        # write slices per payload length, valid for _slices_size
+        self._slices: Dict[int, List[slice]] = {}
+        self._slices_size: int = 0
+        # background task keeping the link up, see startSupervisor()
+        self._supervisor: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+        self._disconnected: Optional[asyncio.Event] = None
+        # reconnect delays in seconds (exponential backoff with full jitter)
+        self.backoff_base: float = 0.5
+        self.backoff_max: float = 30.0
+        # optional outbound queue, see startWriteQueue()
+        self.write_queue: Optional[WriteQueue] = None
+        self._writer: Optional[asyncio.Task] = None
+        self._upload_lock: Optional[asyncio.Lock] = None
+        # device responses received as notifications, see _subscribe()
+        self.notifying: bool = False
+        self._notifications: Optional["asyncio.Queue[bytes]"] = None
+        self._response_waiters: Dict[bytes, Deque[asyncio.Future]] = {}
+        # how upload payloads are acknowledged: "write" (write with response) or "notify" (device notification)
+        self.ack_mode: str = "write"
+        self.ack_timeout: float = 5.0
+        # amount of established links, everything after the first one is a reconnect
+        self.connects: int = 0
+        # optional log of everything sent, see Recorder
+        self.recorder: Optional[Recorder] = None
 
     @staticmethod
     async def scan() -> List[str]:
-        logging.info("scanning for iDotMatrix bluetooth devices...")
-        devices = await BleakScanner.discover(return_adv=True)
-        filtered_devices: List[str] = []
-        for key, (device, adv) in devices.items():
-            if (
-                isinstance(adv, AdvertisementData)
-                and adv.local_name
-                and str(adv.local_name).startswith(BLUETOOTH_DEVICE_NAME)
-            ):
-                logging.info(f"found device {key} with name {adv.local_name}")
-                filtered_devices.append(device.address)
-        return filtered_devices
+        return await BleakTransport.scan()
+
+    def setTransport(self, transport: Transport) -> None:
+        """Uses the given link to talk to the device, e.g. a SimulatedTransport.
+
+        Args:
+            transport (Transport): link to the device
+        """
+        transport.disconnected_callback = self._onDisconnect
+        self.transport = transport
+        self.address = transport.address
+
+    @property
+    def client(self) -> Optional[BleakClient]:
+        """The bleak client of the device if the connection uses the BleakTransport."""
+        return getattr(self.transport, "client", None)
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether the link to the device is up."""
+        return bool(self.transport and self.transport.is_connected)
 
     async def connectByAddress(self, address: str) -> None:
         self.address = address
@@ -55,33 +124,534 @@ class ConnectionManager(metaclass=SingletonMeta):
         else:
             self.logging.error("no target devices found.")
 
+    async def _connectTransport(self) -> None:
+        if not self.transport or self.transport.address != self.address:
+            if self.transport:
+                # the address changed, the link to the previous device must not stay open
+                previous = self.transport
+                previous.disconnected_callback = None
+                if previous.is_connected:
+                    await previous.disconnect()
+                    self.logging.info(f"disconnected from {previous.address}")
+            self.transport = BleakTransport(
+                self.address, disconnected_callback=self._onDisconnect
+            )
+        if not self.transport.is_connected:
+            self.notifying = False
+            start = time.perf_counter()
+            await self.transport.connect()
+            self.connects += 1
+            self.logging.info(f"connected to {self.address}")
+            metrics.observe(
+                "idotmatrix_connect_seconds",
+                time.perf_counter() - start,
+                device=str(self.address),
+            )
+            if self.connects > 1:
+                metrics.increment("idotmatrix_reconnects_total", device=str(self.address))
+        if not self.notifying:
+            await self._subscribe()
+
+    async def _subscribe(self) -> None:
+        """Subscribes once per connection to the notifications of the device."""
+        if self._notifications is None:
+            self._notifications = asyncio.Queue(maxsize=64)
+        try:
+            await self.transport.startNotify(self._onNotification)
+            self.notifying = True
+        except Exception as error:
+            # read() falls back to polling the read characteristic
+            self.logging.warning(f"could not subscribe to notifications: {error}")
+
+    def _onNotification(self, data: bytes) -> None:
+        command = bytes(data[2:4])
+        waiters = self._response_waiters.get(command)
+        while waiters:
+            waiter = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(data)
+                return
+        if self._notifications.full():
+            # nobody reads the responses, keep the newest ones
+            self._notifications.get_nowait()
+        self._notifications.put_nowait(data)
+
+    def expectResponse(self, command: bytes) -> asyncio.Future:
+        """Registers for the next response of the device to the given command.
+
+        Register before sending the command so a fast response can not be missed.
+
+        Args:
+            command (bytes): command bytes 2-3 of the response, e.g. b"\\x01\\x00" for GIF uploads
+
+        Returns:
+            asyncio.Future: resolves with the whole response packet
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        self._response_waiters.setdefault(bytes(command), deque()).append(waiter)
+        return waiter
+
+    async def waitForResponse(
+        self, command: bytes, timeout: Optional[float] = None
+    ) -> Optional[bytes]:
+        """Waits for the next response of the device to the given command.
+
+        Args:
+            command (bytes): command bytes 2-3 of the response
+            timeout (Optional[float]): maximum time to wait in seconds. Defaults to None (wait forever).
+
+        Returns:
+            Optional[bytes]: response packet or None if the timeout expired
+        """
+        try:
+            return await asyncio.wait_for(self.expectResponse(command), timeout)
+        except asyncio.TimeoutError:
+            return None
+
     async def connect(self) -> None:
         if self.address:
-            if not self.client:
-                self.client = BleakClient(self.address)
-            if not self.client.is_connected:
-                await self.client.connect()
-                self.logging.info(f"connected to {self.address}")
+            if self.supervised:
+                # the supervisor keeps the link up, just wait for it
+                await self.waitUntilReady()
+            else:
+                await self._connectTransport()
         else:
             self.logging.error("device address is not set.")
 
+    def _onDisconnect(self, transport: Transport) -> None:
+        self.logging.warning(f"lost connection to {self.address}")
+        self.notifying = False
+        metrics.increment("idotmatrix_disconnects_total", device=str(self.address))
+        if self._ready:
+            self._ready.clear()
+            self._disconnected.set()
+
+    @property
+    def supervised(self) -> bool:
+        """Whether a supervisor task keeps the link to the device up."""
+        return self._supervisor is not None and not self._supervisor.done()
+
+    def startSupervisor(self) -> None:
+        """Starts a background task which connects to the device and reconnects whenever the link drops.
+
+        Afterwards connect() only waits until the link is ready instead of connecting inline.
+        """
+        if not self.address:
+            self.logging.error("device address is not set.")
+            return
+        if not self.supervised:
+            # created here so the events belong to the running event loop
+            self._ready = asyncio.Event()
+            self._disconnected = asyncio.Event()
+            self._supervisor = asyncio.ensure_future(self._supervise())
+
+    async def stopSupervisor(self) -> None:
+        """Stops the supervisor task (the link stays as it is)."""
+        if self._supervisor:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+
+    async def waitUntilReady(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the supervisor reports the link as ready.
+
+        Args:
+            timeout (Optional[float]): maximum time to wait in seconds. Defaults to None (wait forever).
+
+        Returns:
+            bool: True if the link is ready, False if the timeout expired
+        """
+        if not self._ready:
+            return self.is_connected
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def backoff(self, attempt: int) -> float:
+        """Returns the delay before the given reconnect attempt (exponential backoff with full jitter)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    async def _supervise(self) -> None:
+        attempt = 0
+        while True:
+            if not self.is_connected:
+                self._ready.clear()
+                try:
+                    self._disconnected.clear()
+                    await self._connectTransport()
+                    attempt = 0
+                except Exception as error:
+                    delay = self.backoff(attempt)
+                    attempt += 1
+                    self.logging.error(
+                        f"could not connect to {self.address} (attempt {attempt}), retrying in {delay:.1f}s: {error}"
+                    )
+                    await asyncio.sleep(delay)
+                    continue
+            self._ready.set()
+            await self._disconnected.wait()
+            self._disconnected.clear()
+            # spread reconnects of many devices which dropped at the same time
+            await asyncio.sleep(self.backoff(0))
+
     async def disconnect(self) -> None:
-        if self.client and self.client.is_connected:
-            await self.client.disconnect()
+        await self.stopWriteQueue()
+        await self.stopSupervisor()
+        self._ready = None
+        self._disconnected = None
+        if self.is_connected:
+            self.notifying = False
+            await self.transport.disconnect()
             self.logging.info(f"disconnected from {self.address}")
 
-    async def send(self, data, response=False):
-        if self.client and self.client.is_connected:
-            self.logging.debug("sending message(s) to device")
-            chunk_size = self.client.services.get_characteristic(UUID_WRITE_DATA).max_write_without_response_size
-            for i in range(0, len(data), chunk_size):
-                await self.client.write_gatt_char(UUID_WRITE_DATA,data[i:i+chunk_size], response=response)
+    @property
+    def chunk_size(self) -> int:
+        """Maximum amount of bytes per write (negotiated MTU), 0 if not connected."""
+        return self.transport.max_write_size if self.transport else 0
+
+    def _chunkSlices(self, length: int) -> List[slice]:
+        """Returns (cached) slices which split data of the given length into writes."""
+        chunk_size = self.chunk_size
+        if not chunk_size:
+            raise ConnectionError(f"{self.address} is not connected")
+        if chunk_size != self._slices_size:
+            # MTU changed (e.g. after a reconnect)
+            self._slices = {}
+            self._slices_size = chunk_size
+        slices = self._slices.get(length)
+        if slices is None:
+            slices = [
+                slice(i, i + chunk_size) for i in range(0, length, chunk_size)
+            ]
+            if len(self._slices) >= 64:
+                # only the lengths of upload payloads repeat, don't grow unbounded
+                self._slices.clear()
+            self._slices[length] = slices
+        return slices
+
+    def setPacing(
+        self,
+        write_gap: Optional[float] = None,
+        bytes_per_second: Optional[float] = None,
+        burst: Optional[int] = None,
+    ) -> None:
+        """Configures the pacing of the writes to this device.
+
+        Args:
+            write_gap (Optional[float]): minimum gap in seconds between two send() calls. Keeps the current value if None.
+            bytes_per_second (Optional[float]): throughput limit of the link. Disables the limit if None or 0.
+            burst (Optional[int]): amount of bytes which may be sent at once before the limit applies. Defaults to one second worth of bytes.
+        """
+        if write_gap is not None:
+            self.write_gap = max(0.0, write_gap)
+        self.bucket = (
+            TokenBucket(rate=bytes_per_second, capacity=burst)
+            if bytes_per_second
+            else None
+        )
+
+    async def _pace(self) -> None:
+        """Waits (without blocking the event loop) until the write gap since the last send has passed."""
+        delay = self._last_write + self.write_gap - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _write(self, chunk, response: bool) -> None:
+        if self.bucket:
+            await self.bucket.consume(len(chunk))
+        with tracing.span(
+            "gatt.write", device=self.address, size=len(chunk), response=response
+        ):
+            await self.transport.write(chunk, response=response)
 
-            time.sleep(0.01)
+    def _record(self, data, start: float, writes: int) -> None:
+        """Records the on-air time and the amount of bytes of a sent packet or payload."""
+        if metrics.enabled():
+            device = str(self.address)
+            command = metrics.commandName(data)
+            metrics.observe(
+                "idotmatrix_write_seconds",
+                time.perf_counter() - start,
+                device=device,
+                command=command,
+            )
+            metrics.increment(
+                "idotmatrix_bytes_sent_total", len(data), device=device, command=command
+            )
+            metrics.increment(
+                "idotmatrix_writes_total", writes, device=device, command=command
+            )
+
+    async def _sendNow(self, data, response: bool = False):
+        if self.is_connected:
+            if self.logging.isEnabledFor(logging.DEBUG):
+                self.logging.debug(f"sending {len(data)} bytes to {self.address}")
+            await self._pace()
+            if not self.is_connected:
+                # the link dropped while waiting for the write gap
+                return None
+            start = time.perf_counter()
+            slices = self._chunkSlices(len(data))
+            # write views on the packet instead of copies of its slices
+            view = memoryview(data)
+            for chunk in slices:
+                await self._write(view[chunk], response=response)
+            self._last_write = time.monotonic()
+            self._record(data, start, len(slices))
+            if self.recorder:
+                self.recorder.record(self.address, data, response=response)
+            return True
+
+    async def _sendPayloadNow(self, payload, window: Optional[int] = None) -> bool:
+        if not self.is_connected:
+            return False
+        await self._flushPendingBatch()
+        if self.logging.isEnabledFor(logging.DEBUG):
+            self.logging.debug(f"sending payload of {len(payload)} bytes to {self.address}")
+        window = max(1, window or self.pipeline_window)
+        await self._pace()
+        if not self.is_connected:
+            return False
+        start = time.perf_counter()
+        slices = self._chunkSlices(len(payload))
+        if not slices:
             return True
+        view = memoryview(payload)
+        in_flight: Deque[asyncio.Task] = deque()
+        try:
+            for chunk in slices[:-1]:
+                if len(in_flight) >= window:
+                    await in_flight.popleft()
+                in_flight.append(
+                    asyncio.ensure_future(self._write(view[chunk], response=False))
+                )
+                # let the write start so packets leave in order
+                await asyncio.sleep(0)
+            while in_flight:
+                await in_flight.popleft()
+        finally:
+            for task in in_flight:
+                task.cancel()
+        # acknowledge the payload boundary
+        if self.ack_mode == "notify" and self.notifying:
+            ack = self.expectResponse(payload[2:4])
+            await self._write(view[slices[-1]], response=False)
+            try:
+                await asyncio.wait_for(ack, self.ack_timeout)
+            except asyncio.TimeoutError:
+                raise ConnectionError("device did not acknowledge the payload")
+        else:
+            await self._write(view[slices[-1]], response=True)
+        self._last_write = time.monotonic()
+        self._record(payload, start, len(slices))
+        if self.recorder:
+            self.recorder.record(self.address, payload, payload=True)
+        return True
+
+    async def _submit(self, data, response: bool, kind: Optional[bytes]):
+        if self.write_queue is not None:
+            return await self.write_queue.put(data, response=response, kind=kind)
+        return await self._sendNow(data, response=response)
+
+    async def send(self, data, response=False):
+        """Sends a packet to the device.
+
+        Args:
+            data (bytes-like): packet to send, e.g. bytes, bytearray or a memoryview on a payload buffer
+            response (bool): write with response. Defaults to False.
+
+        Returns:
+            True if the packet was sent (or batched), None if the device is not connected
+        """
+        batches = _batches.get()
+        if batches is not None and id(self) in batches:
+            if not response:
+                batches[id(self)].append(bytes(data))
+                return True
+            await self._flushPendingBatch()
+        return await self._submit(data, response=response, kind=commandKind(data))
+
+    async def sendRaw(self, data, response: bool = False):
+        """Sends a packet unchanged, it is neither batched nor coalesced with pending commands (e.g. to replay a recording).
+
+        Args:
+            data (bytes-like): packet or already combined packets to send
+            response (bool): write with response. Defaults to False.
+
+        Returns:
+            True if the packet was sent, None if the device is not connected
+        """
+        await self._flushPendingBatch()
+        return await self._submit(data, response=response, kind=None)
+
+    @asynccontextmanager
+    async def batch(self) -> AsyncIterator["ConnectionManager"]:
+        """Collects the packets sent inside the context and flushes them as few writes as possible.
+
+        Consecutive packets are concatenated up to the chunk size of the connection. The device
+        splits them again by their length prefix, so e.g. a scene change (mode, color, brightness
+        and flip) takes one write instead of four. Only packets sent from the current task are
+        collected. Writes with response and upload payloads are not batched, the packets collected
+        before them are flushed first so the order of the writes is kept.
+
+        Example:
+            async with conn.batch():
+                await Clock(conn=conn).setMode(1)
+                await Common(conn=conn).setBrightness(50)
+        """
+        batches = _batches.get()
+        if batches is not None and id(self) in batches:
+            # nested batch, the outer one flushes
+            yield self
+            return
+        batches = dict(batches or {})
+        batches[id(self)] = []
+        token = _batches.set(batches)
+        try:
+            yield self
+        finally:
+            _batches.reset(token)
+        await self._flushBatch(batches[id(self)])
+
+    async def _flushPendingBatch(self) -> None:
+        """Flushes the packets batched so far by the current task before a write which bypasses the batch."""
+        batches = _batches.get()
+        packets = batches.get(id(self)) if batches is not None else None
+        if packets:
+            pending = packets[:]
+            packets.clear()
+            await self._flushBatch(pending)
+
+    async def _flushBatch(self, packets: List[bytes]) -> None:
+        limit = self.chunk_size
+        group: List[bytes] = []
+        size = 0
+        for packet in packets + [b""]:
+            if group and (not packet or size + len(packet) > limit):
+                # a combined write must not be coalesced by the kind of its first packet
+                await self._submit(
+                    b"".join(group),
+                    response=False,
+                    kind=commandKind(group[0]) if len(group) == 1 else None,
+                )
+                group = []
+                size = 0
+            if packet:
+                group.append(packet)
+                size += len(packet)
+
+    async def sendPayloads(
+        self, payloads: Iterable[bytes], window: Optional[int] = None
+    ) -> bool:
+        """Sends framed payloads (e.g. the 4 KB chunks of an upload) pipelined.
+
+        Inside a payload up to `window` write-without-response packets are kept in flight.
+        Only the last packet of every payload is written with response, so there is one
+        acknowledgement per payload instead of one round-trip per packet. The payloads are sent
+        one after another, nothing is sent after a payload which failed.
+
+        Args:
+            payloads (Iterable[bytes]): framed payloads to send in order
+            window (Optional[int]): amount of packets in flight. Defaults to self.pipeline_window (always used if the write queue is active).
+
+        Returns:
+            bool: True if everything was sent, False if the device is not connected
+        """
+        await self._flushPendingBatch()
+        for payload in payloads:
+            if self.write_queue is not None:
+                # one payload at a time, a failed one must not be followed by orphaned continuation chunks
+                sent = await self.write_queue.put(
+                    payload, response=True, payload=True, priority=PRIORITY_BULK
+                )
+            else:
+                sent = await self._sendPayloadNow(payload, window=window)
+            if not sent:
+                return False
+        return True
+
+    @property
+    def upload_lock(self) -> asyncio.Lock:
+        """Lock which keeps the payloads of concurrent uploads to this device from interleaving."""
+        if self._upload_lock is None:
+            self._upload_lock = asyncio.Lock()
+        return self._upload_lock
+
+    def startWriteQueue(self) -> None:
+        """Routes all writes through an outbound queue drained by a background task.
+
+        The queue serializes writes of concurrent coroutines and coalesces pending commands
+        of the same kind (e.g. brightness or fullscreen color), so only the newest value is sent.
+        Commands sent with send() are scheduled before the payloads of running uploads.
+        """
+        if self.write_queue is None:
+            self.write_queue = WriteQueue()
+            self._writer = asyncio.ensure_future(self._drainWriteQueue())
+
+    async def stopWriteQueue(self) -> None:
+        """Stops the outbound queue, pending writes are cancelled."""
+        if self._writer:
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if self.write_queue is not None:
+            self.write_queue.cancel()
+            self.write_queue = None
+
+    async def _writeRequest(self, request: WriteRequest):
+        await self.connect()
+        if request.payload:
+            return await self._sendPayloadNow(request.data)
+        return await self._sendNow(request.data, response=request.response)
+
+    async def _drainWriteQueue(self) -> None:
+        # the task may have inherited a batch of the task which started the queue, never flush it here
+        _batches.set(None)
+        while True:
+            request = await self.write_queue.get()
+            metrics.observe(
+                "idotmatrix_queue_wait_seconds",
+                time.perf_counter() - request.enqueued,
+                device=str(self.address),
+                command=metrics.commandName(request.data),
+            )
+            try:
+                request.resolve(await self._writeRequest(request))
+            except asyncio.CancelledError:
+                request.resolve(error=ConnectionError("write queue stopped"))
+                raise
+            except Exception as error:
+                self.logging.error(f"could not send queued message: {error}")
+                request.resolve(error=error)
+
+    async def read(self, timeout: Optional[float] = 1.0) -> Optional[bytes]:
+        """Returns the next response of the device.
+
+        Responses arrive as notifications once connected. Only transports that can not notify
+        fall back to reading the current value of the read characteristic.
+
+        Args:
+            timeout (Optional[float]): maximum time to wait for a notification in seconds. None waits forever. Defaults to 1.0.
 
-    async def read(self) -> bytes:
-        if self.client and self.client.is_connected:
-            data = await self.client.read_gatt_char(UUID_READ_DATA)
-            self.logging.info("data received")
+        Returns:
+            Optional[bytes]: response or None if not connected or no notification arrived within the timeout
+        """
+        if self.is_connected:
+            if self.notifying:
+                try:
+                    data = await asyncio.wait_for(self._notifications.get(), timeout)
+                except asyncio.TimeoutError:
+                    self.logging.debug("no response within the timeout")
+                    return None
+            else:
+                data = await self.transport.read()
+            self.logging.debug("data received")
             return data
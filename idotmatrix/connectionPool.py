@@ -0,0 +1,162 @@
+import asyncio
+from .connectionManager import ConnectionManager, SingletonMeta
+from .recorder import Recorder
+from .transports import Transport
+import logging
+from typing import Dict, Iterator, List, Optional
+
+
+class ConnectionPool(metaclass=SingletonMeta):
+    """Keeps one ConnectionManager per device address so a single event loop can drive many displays.
+
+    Modules are bound to a pooled device by passing its connection, e.g. Clock(conn=pool.get(address)).
+    """
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(self) -> None:
+        self.connections: Dict[str, ConnectionManager] = {}
+
+    def _key(self, address: str) -> str:
+        return address.upper()
+
+    def __contains__(self, address: str) -> bool:
+        return self._key(address) in self.connections
+
+    def __iter__(self) -> Iterator[ConnectionManager]:
+        return iter(list(self.connections.values()))
+
+    def __len__(self) -> int:
+        return len(self.connections)
+
+    def _select(self, addresses: Optional[List[str]]) -> List[ConnectionManager]:
+        if addresses is None:
+            return list(self)
+        return [self.get(address) for address in addresses]
+
+    @property
+    def addresses(self) -> List[str]:
+        """Addresses of all pooled devices."""
+        return [conn.address for conn in self.connections.values()]
+
+    def get(self, address: str) -> ConnectionManager:
+        """Returns the connection of the given device and adds it to the pool if necessary.
+
+        Args:
+            address (str): bluetooth address of the device
+
+        Returns:
+            ConnectionManager: connection bound to the device (not connected yet if it is new)
+        """
+        key = self._key(address)
+        if key not in self.connections:
+            self.connections[key] = ConnectionManager(address=address)
+        return self.connections[key]
+
+    def add(self, transport: Transport) -> ConnectionManager:
+        """Adds a device which is reached through the given transport (e.g. a SimulatedTransport).
+
+        Args:
+            transport (Transport): link to the device
+
+        Returns:
+            ConnectionManager: connection bound to the device
+        """
+        conn = self.get(transport.address)
+        conn.setTransport(transport)
+        return conn
+
+    async def connect(self, address: str) -> ConnectionManager:
+        """Connects to the given device (if not connected already).
+
+        Args:
+            address (str): bluetooth address of the device
+
+        Returns:
+            ConnectionManager: connection bound to the device
+        """
+        conn = self.get(address)
+        await conn.connect()
+        return conn
+
+    async def connectAll(
+        self, addresses: Optional[List[str]] = None
+    ) -> List[ConnectionManager]:
+        """Connects to several devices concurrently.
+
+        Args:
+            addresses (Optional[List[str]]): addresses to connect to. Defaults to all pooled devices.
+
+        Returns:
+            List[ConnectionManager]: connections which are connected afterwards
+        """
+        conns = self._select(addresses)
+        results = await asyncio.gather(
+            *[conn.connect() for conn in conns], return_exceptions=True
+        )
+        connected: List[ConnectionManager] = []
+        for conn, result in zip(conns, results):
+            if isinstance(result, BaseException):
+                self.logging.error(f"could not connect to {conn.address}: {result}")
+            elif conn.is_connected:
+                connected.append(conn)
+        return connected
+
+    async def connectBySearch(self) -> List[ConnectionManager]:
+        """Scans for iDotMatrix devices and connects to all of them.
+
+        Returns:
+            List[ConnectionManager]: connections which are connected afterwards
+        """
+        addresses = await ConnectionManager.scan()
+        if not addresses:
+            self.logging.error("no target devices found.")
+            return []
+        return await self.connectAll(addresses)
+
+    def startSupervisors(self, addresses: Optional[List[str]] = None) -> None:
+        """Starts the reconnect supervisor of several devices.
+
+        Args:
+            addresses (Optional[List[str]]): addresses to supervise. Defaults to all pooled devices.
+        """
+        conns = self._select(addresses)
+        for conn in conns:
+            conn.startSupervisor()
+
+    def setRecorder(
+        self, recorder: Optional[Recorder], addresses: Optional[List[str]] = None
+    ) -> None:
+        """Logs everything sent to several devices into one recording.
+
+        Args:
+            recorder (Optional[Recorder]): recorder to use, None stops recording
+            addresses (Optional[List[str]]): addresses to record. Defaults to all pooled devices.
+        """
+        for conn in self._select(addresses):
+            conn.recorder = recorder
+
+    async def disconnect(self, address: str) -> None:
+        """Disconnects the given device but keeps it in the pool.
+
+        Args:
+            address (str): bluetooth address of the device
+        """
+        if address in self:
+            await self.get(address).disconnect()
+
+    async def disconnectAll(self) -> None:
+        """Disconnects all pooled devices concurrently."""
+        await asyncio.gather(
+            *[conn.disconnect() for conn in self], return_exceptions=True
+        )
+
+    async def remove(self, address: str) -> None:
+        """Disconnects the given device and removes it from the pool.
+
+        Args:
+            address (str): bluetooth address of the device
+        """
+        conn = self.connections.pop(self._key(address), None)
+        if conn:
+            await conn.disconnect()
@@ -1,3 +1,61 @@
 UUID_WRITE_DATA = "0000fa02-0000-1000-8000-00805f9b34fb"
 UUID_READ_DATA = "0000fa03-0000-1000-8000-00805f9b34fb"
-BLUETOOTH_DEVICE_NAME = "IDM-"
\ No newline at end of file
+BLUETOOTH_DEVICE_NAME = "IDM-"
+
+# commands (bytes 2-3 of the packet) which switch the display mode, only the latest one of
+# all of them matters
+DISPLAY_MODE_COMMANDS = {
+    (2, 2),  # FullscreenColor.setMode
+    (3, 2),  # Effect.setMode
+    (6, 1),  # Clock.setMode
+    (10, 128),  # Scoreboard.setMode
+}
+# commands (bytes 2-3 of the packet) where only the latest value matters
+COALESCABLE_COMMANDS = {
+    (1, 128),  # Common.setTime
+    (4, 128),  # Common.setBrightness
+    (6, 128),  # Common.flipScreen
+    (7, 1),  # Common.screenOn / Common.screenOff
+} | DISPLAY_MODE_COMMANDS
+
+# readable names of the commands (bytes 2-3 of the packet), e.g. for metric labels
+COMMAND_NAMES = {
+    (0, 0): "image",
+    (0, 2): "music_sync",
+    (1, 0): "gif",
+    (1, 128): "time",
+    (2, 1): "delete_device_data",
+    (2, 2): "fullscreen_color",
+    (2, 128): "eco",
+    (3, 0): "text",
+    (3, 1): "speed",
+    (3, 2): "effect",
+    (4, 1): "image_mode",
+    (4, 2): "password",
+    (4, 128): "brightness",
+    (5, 1): "graffiti",
+    (6, 1): "clock",
+    (6, 128): "flip",
+    (7, 1): "screen",
+    (7, 128): "time_indicator",
+    (8, 128): "countdown",
+    (9, 128): "chronograph",
+    (10, 128): "scoreboard",
+    (11, 128): "mic_type",
+    (12, 128): "joint",
+}
+
+# text cell geometries (width, height) and the separator in front of every cell bitmap
+TEXT_CELLS = {
+    (8, 16): b"\x02\xff\xff\xff",
+    (16, 32): b"\x05\xff\xff\xff",
+    # not verified on a device yet, derived from the 64x64 panels (only used if selected explicitly)
+    (32, 64): b"\x06\xff\xff\xff",
+}
+# default text cell geometry per panel size
+PANEL_TEXT_CELLS = {
+    16: (8, 16),
+    32: (16, 32),
+    # keeps the verified 16x32 cells until the 32x64 separator is confirmed on a device
+    64: (16, 32),
+}
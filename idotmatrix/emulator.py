@@ -0,0 +1,301 @@
+import io
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+import zlib
+
+from .const import COMMAND_NAMES, TEXT_CELLS
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+# largest packet of a command (bytes 2-3) which can be decoded
+MAX_PACKET_SIZES = {
+    (0, 0): 9 + 4096,  # image chunk
+    (1, 0): 16 + 4096,  # gif chunk
+    (3, 0): 0xFFFF,  # text, grows with the amount of characters
+}
+# largest packet of all other commands
+MAX_COMMAND_SIZE = 256
+
+
+class DeviceEmulator:
+    """Software iDotMatrix device which decodes the byte stream sent to a real display.
+
+    The emulator consumes exactly what the modules send (in any write segmentation, e.g. fed by
+    SimulatedTransport(on_write=emulator.feed)), reassembles the 4 KB chunked uploads, verifies
+    their length and CRC32 headers and keeps a numpy framebuffer of what the panel would show.
+    Protocol violations are collected in self.errors instead of raising, so high volume runs
+    can check them at the end. Call reset() when the link drops (SimulatedTransport does it with
+    on_disconnect=emulator.reset), partially received packets and uploads are discarded then.
+
+    Requires numpy (pip install idotmatrix[emulator]).
+    """
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(self, size: int = 32) -> None:
+        """Initializes the emulator.
+
+        Args:
+            size (int): amount of pixels per side of the emulated panel (16, 32 or 64). Defaults to 32.
+        """
+        if np is None:
+            raise ImportError("DeviceEmulator requires numpy (pip install numpy)")
+        self.size = size
+        self.framebuffer = np.zeros((size, size, 3), dtype=np.uint8)
+        self.state: Dict[str, Any] = {
+            "screen_on": True,
+            "brightness": 100,
+            "flipped": False,
+            "mode": None,
+        }
+        # amount of decoded packets per command (bytes 2-3)
+        self.packets: Dict[Tuple[int, int], int] = {}
+        self.errors: List[str] = []
+        self._buffer = bytearray()
+        self._upload: Optional[bytearray] = None
+        self._upload_header: Optional[Tuple[int, Optional[int]]] = None
+
+    def feed(self, data: bytes) -> None:
+        """Consumes bytes written to the device.
+
+        Args:
+            data (bytes): written data, packets may be split across or combined in writes
+        """
+        self._buffer.extend(data)
+        while len(self._buffer) >= 4:
+            command = (self._buffer[2], self._buffer[3])
+            if command not in COMMAND_NAMES:
+                # the stream is out of sync, waiting for a garbage length would stall forever
+                self._error(
+                    f"unknown command {command[0]:02x}{command[1]:02x}, dropping buffer"
+                )
+                self._buffer.clear()
+                return
+            if command == (0, 0):
+                length = self._imageChunkLength()
+            else:
+                length = int.from_bytes(self._buffer[0:2], byteorder="little")
+            if length is None:
+                return
+            if length < 4 or length > MAX_PACKET_SIZES.get(command, MAX_COMMAND_SIZE):
+                self._error(
+                    f"invalid length {length} of a {COMMAND_NAMES[command]} packet, dropping buffer"
+                )
+                self._buffer.clear()
+                return
+            if len(self._buffer) < length:
+                return
+            packet = bytes(self._buffer[:length])
+            del self._buffer[:length]
+            self.packets[command] = self.packets.get(command, 0) + 1
+            self._handle(command, packet)
+
+    def reset(self) -> None:
+        """Discards partially received packets and uploads, like the device does when the link drops."""
+        if self._buffer or self._upload is not None:
+            self.logging.info("link dropped, discarding partially received data")
+        self._buffer.clear()
+        self._upload = None
+        self._upload_header = None
+
+    def _error(self, message: str) -> None:
+        self.logging.error(message)
+        self.errors.append(message)
+
+    def _imageChunkLength(self) -> Optional[int]:
+        # image chunks carry the total png length instead of their own length
+        if len(self._buffer) < 9:
+            return None
+        if self._buffer[4] and self._upload is None:
+            # a continuation without its first chunk, its length can not be derived
+            self._error("image continuation chunk without an upload, dropping buffer")
+            self._buffer.clear()
+            return None
+        png_len = int.from_bytes(self._buffer[5:9], byteorder="little")
+        received = len(self._upload) if self._buffer[4] else 0
+        return 9 + min(4096, max(0, png_len - received))
+
+    def _handle(self, command: Tuple[int, int], packet: bytes) -> None:
+        handler = {
+            (0, 0): self._handleImageChunk,
+            (1, 0): self._handleGifChunk,
+            (3, 0): self._handleText,
+            (2, 2): self._handleFullscreenColor,
+            (5, 1): self._handlePixel,
+            (4, 128): self._handleBrightness,
+            (6, 128): self._handleFlip,
+            (7, 1): self._handleScreen,
+        }.get(command)
+        if handler:
+            handler(packet)
+        else:
+            # commands which only change the mode of the device (clock, effect, scoreboard, ...)
+            self.state["mode"] = command
+            self.state[f"command_{command[0]}_{command[1]}"] = packet[4:]
+
+    def _collect(
+        self, packet: bytes, header_len: int, first: bool, total_len: int, crc: Optional[int]
+    ) -> Optional[bytes]:
+        """Appends an upload chunk and returns the complete upload once all chunks arrived."""
+        if first:
+            if self._upload is not None:
+                self._error("upload restarted before the previous one was complete")
+            self._upload = bytearray()
+            self._upload_header = (total_len, crc)
+        elif self._upload is None:
+            self._error("upload continued without a first chunk")
+            return None
+        elif self._upload_header != (total_len, crc):
+            self._error("upload header changed between chunks")
+        self._upload.extend(packet[header_len:])
+        if len(self._upload) < total_len:
+            return None
+        data = bytes(self._upload)
+        self._upload = None
+        if len(data) != total_len:
+            self._error(f"upload has {len(data)} bytes, header announced {total_len}")
+            return None
+        if crc is not None and zlib.crc32(data) != crc:
+            self._error("upload CRC32 does not match")
+            return None
+        return data
+
+    def _handleGifChunk(self, packet: bytes) -> None:
+        if len(packet) < 16:
+            self._error("gif chunk is shorter than its header")
+            return
+        data = self._collect(
+            packet,
+            16,
+            first=packet[4] == 0,
+            total_len=int.from_bytes(packet[5:9], byteorder="little"),
+            crc=int.from_bytes(packet[9:13], byteorder="little"),
+        )
+        if data is not None:
+            self.state["mode"] = "gif"
+            self._showImage(data)
+
+    def _handleImageChunk(self, packet: bytes) -> None:
+        data = self._collect(
+            packet,
+            9,
+            first=packet[4] == 0,
+            total_len=int.from_bytes(packet[5:9], byteorder="little"),
+            crc=None,
+        )
+        if data is not None:
+            self.state["mode"] = "image"
+            self._showImage(data)
+
+    def _showImage(self, data: bytes) -> None:
+        from PIL import Image as PilImage
+
+        try:
+            with PilImage.open(io.BytesIO(data)) as img:
+                self.state["frames"] = getattr(img, "n_frames", 1)
+                frame = img.convert("RGB")
+                if frame.size != (self.size, self.size):
+                    frame = frame.resize((self.size, self.size), PilImage.NEAREST)
+                self.framebuffer = np.array(frame, dtype=np.uint8)
+        except Exception as error:
+            self._error(f"could not decode uploaded image: {error}")
+
+    def _handleText(self, packet: bytes) -> None:
+        if len(packet) == 4:
+            # Common.freezeScreen uses the same command bytes
+            self.state["frozen"] = not self.state.get("frozen", False)
+            return
+        if len(packet) < 16 + 14:
+            self._error("text packet is shorter than its header")
+            return
+        body = packet[16:]
+        if int.from_bytes(packet[5:9], byteorder="little") != len(body):
+            self._error("text packet length does not match its header")
+            return
+        if int.from_bytes(packet[9:13], byteorder="little") != zlib.crc32(body):
+            self._error("text packet CRC32 does not match")
+            return
+        num_chars = int.from_bytes(body[0:2], byteorder="little")
+        color_mode = body[6]
+        color = tuple(body[7:10]) if color_mode == 1 else (255, 255, 255)
+        background = tuple(body[11:14]) if body[10] == 1 else (0, 0, 0)
+        cells = self._splitTextCells(body[14:])
+        if len(cells) != num_chars:
+            self._error(f"text announces {num_chars} characters but contains {len(cells)}")
+        self.state["mode"] = "text"
+        self.state["text_mode"] = body[4]
+        self.framebuffer[:, :] = background
+        x = 0
+        for width, height, bitmap in cells:
+            self._drawCell(x, width, height, bitmap, color)
+            x += width
+            if x >= self.size:
+                break
+
+    def _splitTextCells(self, bitmaps: bytes) -> List[Tuple[int, int, bytes]]:
+        # separator byte 0 encodes the cell size: 0x05 = 16x32, 0x02 = 8x16, ...
+        sizes = {separator[0]: size for size, separator in TEXT_CELLS.items()}
+        cells = []
+        i = 0
+        while i + 4 <= len(bitmaps):
+            size = sizes.get(bitmaps[i])
+            if size is None or bitmaps[i + 1 : i + 4] != b"\xff\xff\xff":
+                self._error(f"invalid text separator at offset {i}")
+                break
+            width, height = size
+            length = (width + 7) // 8 * height
+            cells.append((width, height, bitmaps[i + 4 : i + 4 + length]))
+            i += 4 + length
+        return cells
+
+    def _drawCell(
+        self, x: int, width: int, height: int, bitmap: bytes, color: Tuple[int, int, int]
+    ) -> None:
+        row_bytes = (width + 7) // 8
+        bits = np.unpackbits(
+            np.frombuffer(bitmap, dtype=np.uint8).reshape(height, row_bytes),
+            axis=1,
+            bitorder="little",
+        )[:, :width].astype(bool)
+        bits = bits[: self.size, : max(0, self.size - x)]
+        region = self.framebuffer[: bits.shape[0], x : x + bits.shape[1]]
+        region[bits] = color
+
+    def _handleFullscreenColor(self, packet: bytes) -> None:
+        self.state["mode"] = "color"
+        self.framebuffer[:, :] = tuple(packet[4:7])
+
+    def _handlePixel(self, packet: bytes) -> None:
+        r, g, b, x, y = packet[5:10]
+        if x >= self.size or y >= self.size:
+            self._error(f"pixel ({x}, {y}) is outside of the panel")
+            return
+        self.state["mode"] = "graffiti"
+        self.framebuffer[y, x] = (r, g, b)
+
+    def _handleBrightness(self, packet: bytes) -> None:
+        self.state["brightness"] = packet[4]
+
+    def _handleFlip(self, packet: bytes) -> None:
+        self.state["flipped"] = bool(packet[4])
+
+    def _handleScreen(self, packet: bytes) -> None:
+        self.state["screen_on"] = bool(packet[4])
+
+    def render(self) -> "np.ndarray":
+        """Returns what the panel currently shows (brightness, flip and screen state applied).
+
+        Returns:
+            np.ndarray: RGB image of shape (size, size, 3)
+        """
+        if not self.state["screen_on"]:
+            return np.zeros_like(self.framebuffer)
+        image = self.framebuffer
+        if self.state["flipped"]:
+            image = image[::-1, ::-1]
+        return (image.astype(np.uint16) * self.state["brightness"] // 100).astype(
+            np.uint8
+        )
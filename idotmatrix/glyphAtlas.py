@@ -0,0 +1,185 @@
+"""Precompiled glyph atlases for Text.
+
+An atlas holds the packed cell bitmaps of a font for a character set, already in the layout of
+Text (separator followed by the bitmap), so Text can build its packets by slicing a memory
+mapped file instead of rasterizing glyphs. Build one with:
+
+    python -m idotmatrix.glyphAtlas fonts/Rain-DRM3.otf 16 rain16.idma
+"""
+
+import argparse
+from bisect import bisect_left
+import mmap
+import os
+import struct
+import sys
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from .const import TEXT_CELLS
+
+# file signature including the format version
+MAGIC = b"IDMA\x01"
+# font size, amount of sections, length of the font name
+_HEADER = struct.Struct("<HBH")
+# cell width, cell height, separator, amount of glyphs, offset of the codepoint index
+_SECTION = struct.Struct("<BB4sII")
+
+# cell geometries included by default
+DEFAULT_CELLS = ((16, 32), (8, 16))
+# printable ASCII and Latin-1
+DEFAULT_CHARSET = "".join(chr(c) for c in range(0x20, 0x7F)) + "".join(
+    chr(c) for c in range(0xA0, 0x100)
+)
+
+
+def buildAtlas(
+    font_path: str,
+    font_size: int,
+    output_path: str,
+    charset: str = DEFAULT_CHARSET,
+    cells: Iterable[Tuple[int, int]] = DEFAULT_CELLS,
+) -> None:
+    """Rasterizes the characters of a font into an atlas file.
+
+    Args:
+        font_path (str): path to the TrueType/OpenType font
+        font_size (int): size of the font
+        output_path (str): path of the atlas file to write
+        charset (str): characters to include. Defaults to printable ASCII and Latin-1.
+        cells (Iterable[Tuple[int, int]]): cell geometries (width, height) to include. Defaults to 16x32 and 8x16.
+    """
+    from .glyphCache import loadFont, renderGlyph
+
+    font = loadFont(font_path, font_size)
+    codepoints = sorted(set(ord(char) for char in charset))
+    name = os.path.basename(font_path).encode("utf-8")
+    cells = list(cells)
+    sections = []
+    offset = len(MAGIC) + _HEADER.size + len(name) + len(cells) * _SECTION.size
+    for width, height in cells:
+        separator = TEXT_CELLS[(width, height)]
+        # keep the codepoint index 4-byte aligned so it can be cast without copying
+        offset += -offset % 4
+        index = struct.pack(f"<{len(codepoints)}I", *codepoints)
+        glyphs = b"".join(
+            separator + renderGlyph(chr(c), font, width, height) for c in codepoints
+        )
+        sections.append((width, height, separator, offset, index + glyphs))
+        offset += len(index) + len(glyphs)
+    with open(output_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(_HEADER.pack(font_size, len(cells), len(name)))
+        file.write(name)
+        for width, height, separator, section_offset, _ in sections:
+            file.write(
+                _SECTION.pack(width, height, separator, len(codepoints), section_offset)
+            )
+        for _, _, _, section_offset, data in sections:
+            file.write(b"\0" * (section_offset - file.tell()))
+            file.write(data)
+
+
+class GlyphAtlas:
+    """Memory mapped atlas written by buildAtlas()."""
+
+    def __init__(self, path: str) -> None:
+        """Opens the atlas.
+
+        Args:
+            path (str): path to the atlas file
+        """
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        # cell geometry -> (codepoint index, offset of the glyph records, size of a record)
+        self._sections: Dict[Tuple[int, int], Tuple[Sequence[int], int, int]] = {}
+        if self._view[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a glyph atlas")
+        offset = len(MAGIC)
+        self.font_size, count, name_len = _HEADER.unpack_from(self._view, offset)
+        offset += _HEADER.size
+        self.font_name = bytes(self._view[offset : offset + name_len]).decode("utf-8")
+        offset += name_len
+        for _ in range(count):
+            width, height, separator, glyphs, index_offset = _SECTION.unpack_from(
+                self._view, offset
+            )
+            offset += _SECTION.size
+            index_view = self._view[index_offset : index_offset + glyphs * 4]
+            if sys.byteorder == "little":
+                index: Sequence[int] = index_view.cast("I")
+            else:
+                index = struct.unpack(f"<{glyphs}I", index_view)
+            stride = len(separator) + (width + 7) // 8 * height
+            self._sections[(width, height)] = (index, index_offset + glyphs * 4, stride)
+
+    def matches(self, font_path: str, font_size: int) -> bool:
+        """Whether the atlas was built from the given font (compared by file name) and size."""
+        return (
+            self.font_name == os.path.basename(font_path) and self.font_size == font_size
+        )
+
+    @property
+    def cells(self) -> Sequence[Tuple[int, int]]:
+        """Cell geometries (width, height) contained in the atlas."""
+        return list(self._sections)
+
+    def glyph(self, char: str, width: int, height: int) -> Optional[bytes]:
+        """Returns separator and bitmap of a character.
+
+        Args:
+            char (str): character
+            width (int): width of the cell
+            height (int): height of the cell
+
+        Returns:
+            Optional[bytes]: copy of the record or None if the atlas does not contain it
+        """
+        section = self._sections.get((width, height))
+        if section is None:
+            return None
+        index, records, stride = section
+        codepoint = ord(char)
+        position = bisect_left(index, codepoint)
+        if position == len(index) or index[position] != codepoint:
+            return None
+        start = records + position * stride
+        # a copy, a view would keep the mapping exported and make close() fail
+        return self._mmap[start : start + stride]
+
+    def close(self) -> None:
+        """Unmaps the atlas."""
+        self._sections.clear()
+        self._view.release()
+        self._mmap.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="build a glyph atlas for Text")
+    parser.add_argument("font_path", help="TrueType/OpenType font")
+    parser.add_argument("font_size", type=int)
+    parser.add_argument("output_path", help="atlas file to write")
+    parser.add_argument("--chars", default=DEFAULT_CHARSET, help="characters to include")
+    parser.add_argument(
+        "--cells",
+        default="16x32,8x16",
+        help="comma separated cell sizes, e.g. 8x16,16x32,32x64",
+    )
+    args = parser.parse_args()
+    cells = []
+    for cell in args.cells.split(","):
+        try:
+            width, height = (int(value) for value in cell.split("x"))
+        except ValueError:
+            parser.error(f"invalid cell size {cell!r}, expected WIDTHxHEIGHT")
+        if (width, height) not in TEXT_CELLS:
+            parser.error(
+                f"unsupported cell size {cell!r}, expected one of "
+                + ", ".join(f"{w}x{h}" for w, h in TEXT_CELLS)
+            )
+        cells.append((width, height))
+    buildAtlas(
+        args.font_path, args.font_size, args.output_path, charset=args.chars, cells=cells
+    )
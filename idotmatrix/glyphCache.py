@@ -0,0 +1,210 @@
+from collections import OrderedDict
+from functools import lru_cache
+import os
+import math
+from typing import Dict, Hashable, List, Optional
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+@lru_cache(maxsize=32)
+def _loadFont(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    return ImageFont.truetype(font_path, font_size)
+
+
+def loadFont(font_path: str, font_size: int) -> ImageFont.FreeTypeFont:
+    """Loads a TrueType/OpenType font once per process and size.
+
+    Args:
+        font_path (str): path to the font file
+        font_size (int): size of the font
+
+    Returns:
+        ImageFont.FreeTypeFont: loaded font (shared, do not modify it)
+    """
+    return _loadFont(os.path.abspath(font_path), font_size)
+
+
+def packBitmap(image: Image.Image) -> bytes:
+    """Packs a 1-bit image row by row, least significant bit first (the leftmost pixel is bit 0).
+
+    Args:
+        image (Image.Image): image in mode "1"
+
+    Returns:
+        bytes: packed rows, each padded to full bytes
+    """
+    # Pillow's raw packer does this in C, "1;R" reverses the bit order of every byte
+    return image.tobytes("raw", "1;R")
+
+
+def renderGlyph(
+    char: str, font: ImageFont.FreeTypeFont, width: int, height: int
+) -> bytes:
+    """Draws a single character centered into a cell and packs it.
+
+    Args:
+        char (str): character to draw
+        font (ImageFont.FreeTypeFont): font to draw with
+        width (int): width of the cell in pixels
+        height (int): height of the cell in pixels
+
+    Returns:
+        bytes: packed bitmap of the cell
+    """
+    image = Image.new("1", (width, height), 0)
+    draw = ImageDraw.Draw(image)
+    _, _, text_width, text_height = draw.textbbox((0, 0), text=char, font=font)
+    text_x = (width - text_width) // 2
+    text_y = (height - text_height) // 2
+    draw.text((text_x, text_y), char, fill=1, font=font)
+    return packBitmap(image)
+
+
+def renderStrip(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    width: int,
+    height: int,
+    proportional: bool = True,
+) -> List[bytes]:
+    """Draws a whole string onto one strip and slices it into packed cells.
+
+    Args:
+        text (str): string to draw
+        font (ImageFont.FreeTypeFont): font to draw with
+        width (int): width of a cell in pixels (a multiple of 8)
+        height (int): height of a cell in pixels
+        proportional (bool): draw the string in one pass with the advances and kerning of the font. Otherwise every character is centered into its own cell of the strip. Defaults to True.
+
+    Returns:
+        List[bytes]: packed bitmaps of the cells from left to right
+    """
+    if not text:
+        return []
+    if proportional:
+        text_width = font.getlength(text)
+        cells = max(1, math.ceil(text_width / width))
+    else:
+        cells = len(text)
+    image = Image.new("1", (cells * width, height), 0)
+    draw = ImageDraw.Draw(image)
+    if proportional:
+        _, _, _, text_height = draw.textbbox((0, 0), text=text, font=font)
+        text_x = (cells * width - int(math.ceil(text_width))) // 2
+        draw.text((text_x, (height - text_height) // 2), text, fill=1, font=font)
+    else:
+        for i, char in enumerate(text):
+            _, _, char_width, char_height = draw.textbbox((0, 0), text=char, font=font)
+            draw.text(
+                (i * width + (width - char_width) // 2, (height - char_height) // 2),
+                char,
+                fill=1,
+                font=font,
+            )
+    packed = packBitmap(image)
+    # every row of the strip holds the same row of all cells, gather them with strided slices
+    row_bytes = cells * width // 8
+    cell_bytes = width // 8
+    bitmaps = []
+    for i in range(cells):
+        bitmap = bytearray(cell_bytes * height)
+        for byte in range(cell_bytes):
+            bitmap[byte::cell_bytes] = packed[i * cell_bytes + byte :: row_bytes]
+        bitmaps.append(bytes(bitmap))
+    return bitmaps
+
+
+class GlyphCache:
+    """LRU cache of packed glyph bitmaps, bounded by the size of the bitmaps.
+
+    Text keys the glyphs by font path, font size, character and cell size, so re-encoding a
+    string from a small alphabet only concatenates cached bitmaps.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024) -> None:
+        """Initializes the cache.
+
+        Args:
+            max_bytes (int): maximum size of the cached bitmaps. Defaults to 4 MB.
+        """
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        """Returns the bitmap of the given key and marks it as recently used.
+
+        Args:
+            key (Hashable): key of the glyph
+
+        Returns:
+            Optional[bytes]: packed bitmap or None
+        """
+        bitmap = self._entries.get(key)
+        if bitmap is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return bitmap
+
+    def put(self, key: Hashable, bitmap: bytes) -> None:
+        """Stores a packed bitmap and evicts the least recently used ones if the cache is full.
+
+        Args:
+            key (Hashable): key of the glyph
+            bitmap (bytes): packed bitmap
+        """
+        if key in self._entries:
+            self.size -= len(self._entries.pop(key))
+        self._entries[key] = bitmap
+        self.size += len(bitmap)
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Removes all glyphs."""
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the counters of the glyph cache and the font cache."""
+        fonts = _loadFont.cache_info()
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "fonts": fonts.currsize,
+            "font_hits": fonts.hits,
+            "font_misses": fonts.misses,
+        }
+
+
+# cache used by Text, None disables caching of glyphs
+_cache: Optional[GlyphCache] = GlyphCache()
+
+
+def setGlyphCache(cache: Optional[GlyphCache]) -> None:
+    """Replaces the glyph cache of Text.
+
+    Args:
+        cache (Optional[GlyphCache]): cache to use. None disables it.
+    """
+    global _cache
+    _cache = cache
+
+
+def getGlyphCache() -> Optional[GlyphCache]:
+    """Returns the active glyph cache or None if caching is disabled."""
+    return _cache
@@ -1,12 +1,24 @@
 import logging
+from typing import Optional
 
+# the library only logs, applications decide where the records go (see configureLogging())
+logging.getLogger("idotmatrix").addHandler(logging.NullHandler())
 
-# set basic logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s :: %(levelname)s :: %(name)s :: %(message)s",
-    datefmt="%d.%m.%Y %H:%M:%S",
-    handlers=[logging.StreamHandler()],
-)
-# set log level of bleak
-logging.getLogger("bleak").setLevel(logging.WARNING)
+
+def configureLogging(
+    level: int = logging.DEBUG, handler: Optional[logging.Handler] = None
+) -> None:
+    """Configures the root logger with the format of the library. Call it once from your application.
+
+    Args:
+        level (int): log level. Defaults to logging.DEBUG.
+        handler (Optional[logging.Handler]): handler receiving the records. Defaults to a StreamHandler.
+    """
+    logging.basicConfig(
+        level=level,
+        format="%(asctime)s :: %(levelname)s :: %(name)s :: %(message)s",
+        datefmt="%d.%m.%Y %H:%M:%S",
+        handlers=[handler or logging.StreamHandler()],
+    )
+    # set log level of bleak
+    logging.getLogger("bleak").setLevel(logging.WARNING)
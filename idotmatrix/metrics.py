@@ -0,0 +1,230 @@
+import bisect
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from .const import COMMAND_NAMES
+
+# upper bounds of the histogram buckets, suitable for seconds as well as bytes per second
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    100.0,
+    1000.0,
+    10000.0,
+    100000.0,
+)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def commandName(data: bytes) -> str:
+    """Returns a readable name of the command of a packet (used as metric label).
+
+    Args:
+        data (bytes): packet sent to the device
+
+    Returns:
+        str: name of the command, or its bytes 2-3 in hex if it is unknown
+    """
+    if len(data) < 4:
+        return "unknown"
+    command = (data[2], data[3])
+    return COMMAND_NAMES.get(command, f"{command[0]:02x}{command[1]:02x}")
+
+
+class MetricsSink:
+    """Receives the measurements of the library. Subclass it to forward them to your monitoring."""
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        """Records a single measurement (e.g. a duration).
+
+        Args:
+            name (str): name of the metric
+            value (float): measured value
+            labels (Dict[str, str]): labels like device and command
+        """
+        raise NotImplementedError
+
+    def increment(self, name: str, amount: float, labels: Dict[str, str]) -> None:
+        """Increments a counter.
+
+        Args:
+            name (str): name of the metric
+            amount (float): amount to add
+            labels (Dict[str, str]): labels like device and command
+        """
+        raise NotImplementedError
+
+
+class Histogram:
+    """Cumulative histogram with fixed buckets."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """Returns (upper bound, cumulative count) pairs including +Inf."""
+        result = []
+        total = 0
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class MetricsRegistry(MetricsSink):
+    """In-memory sink which aggregates histograms and counters and dumps them as Prometheus text or JSON."""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.buckets = buckets
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name: str, value: float, labels: Dict[str, str]) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram(self.buckets)
+            series[key].observe(value)
+
+    def increment(self, name: str, amount: float, labels: Dict[str, str]) -> None:
+        key = self._labels(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def reset(self) -> None:
+        """Removes all recorded metrics."""
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    @staticmethod
+    def _format(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(labels) + ([extra] if extra else [])
+        if not pairs:
+            return ""
+        escaped = (
+            key
+            + '="'
+            + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            + '"'
+            for key, value in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+
+    def toPrometheus(self) -> str:
+        """Dumps all metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: metrics as text
+        """
+        lines: List[str] = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{self._format(labels)} {value}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for labels, histogram in sorted(series.items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            f"{name}_bucket{self._format(labels, ('le', bound))} {count}"
+                        )
+                    lines.append(f"{name}_sum{self._format(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{self._format(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def toDict(self) -> Dict[str, List[dict]]:
+        """Returns all metrics as plain data.
+
+        Returns:
+            Dict[str, List[dict]]: series per metric name
+        """
+        result: Dict[str, List[dict]] = {}
+        with self._lock:
+            for name, series in self.counters.items():
+                result[name] = [
+                    {"labels": dict(labels), "value": value}
+                    for labels, value in series.items()
+                ]
+            for name, series in self.histograms.items():
+                result[name] = [
+                    {
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": dict(histogram.cumulative()),
+                    }
+                    for labels, histogram in series.items()
+                ]
+        return result
+
+    def toJson(self) -> str:
+        """Dumps all metrics as JSON.
+
+        Returns:
+            str: metrics as JSON
+        """
+        return json.dumps(self.toDict(), sort_keys=True)
+
+
+# sink receiving all measurements, None disables the instrumentation
+_sink: Optional[MetricsSink] = None
+
+
+def setMetricsSink(sink: Optional[MetricsSink]) -> None:
+    """Enables the instrumentation of the library.
+
+    Args:
+        sink (Optional[MetricsSink]): sink receiving the measurements, e.g. a MetricsRegistry. None disables it.
+    """
+    global _sink
+    _sink = sink
+
+
+def getMetricsSink() -> Optional[MetricsSink]:
+    """Returns the active sink or None if the instrumentation is disabled."""
+    return _sink
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def observe(name: str, value: float, **labels: str) -> None:
+    if _sink is not None:
+        _sink.observe(name, value, labels)
+
+
+def increment(name: str, amount: float = 1, **labels: str) -> None:
+    if _sink is not None:
+        _sink.increment(name, amount, labels)
@@ -1,14 +1,48 @@
-from .clock import Clock
-from .chronograph import Chronograph
-from .common import Common
-from .countdown import Countdown
-from .eco import Eco
-from .fullscreenColor import FullscreenColor
-from .gif import Gif
-from .graffiti import Graffiti
-from .image import Image
-from .musicSync import MusicSync
-from .scoreboard import Scoreboard
-from .system import System
-from .text import Text
-from .effect import Effect
\ No newline at end of file
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .clock import Clock
+    from .chronograph import Chronograph
+    from .common import Common
+    from .countdown import Countdown
+    from .eco import Eco
+    from .fullscreenColor import FullscreenColor
+    from .gif import Gif
+    from .graffiti import Graffiti
+    from .image import Image
+    from .musicSync import MusicSync
+    from .scoreboard import Scoreboard
+    from .system import System
+    from .text import Text
+    from .effect import Effect
+
+# modules are imported on first access, importing one of them must not load the others
+_lazy = {
+    "Clock": ".clock",
+    "Chronograph": ".chronograph",
+    "Common": ".common",
+    "Countdown": ".countdown",
+    "Eco": ".eco",
+    "FullscreenColor": ".fullscreenColor",
+    "Gif": ".gif",
+    "Graffiti": ".graffiti",
+    "Image": ".image",
+    "MusicSync": ".musicSync",
+    "Scoreboard": ".scoreboard",
+    "System": ".system",
+    "Text": ".text",
+    "Effect": ".effect",
+}
+
+
+def __getattr__(name: str) -> Any:
+    if name not in _lazy:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(_lazy[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_lazy))
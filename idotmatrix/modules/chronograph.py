@@ -1,13 +1,13 @@
 from ..connectionManager import ConnectionManager
 import logging
-from typing import Union
+from typing import Union, Optional
 
 
 class Chronograph:
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setMode(self, mode: int) -> Union[bool, bytearray]:
         """Starts/Stops the Chronograph.
@@ -10,8 +10,8 @@ class Clock:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setTimeIndicator(self, enabled: bool = True) -> Union[bool, bytearray]:
         """Sets the time indicator of the clock. Does not seem to work currently (maybe in a future update?).
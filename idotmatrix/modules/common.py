@@ -11,8 +11,8 @@ class Common:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def freezeScreen(self) -> bytearray:
         """Freezes or unfreezes the screen.
@@ -1,6 +1,6 @@
 from ..connectionManager import ConnectionManager
 import logging
-from typing import Union
+from typing import Union, Optional
 
 
 class Eco:
@@ -11,8 +11,8 @@ class Eco:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setMode(
         self,
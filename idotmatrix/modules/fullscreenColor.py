@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Optional
 from ..connectionManager import ConnectionManager
 import logging
 
@@ -10,8 +10,8 @@ class FullscreenColor:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setMode(
         self, r: int = 0, g: int = 0, b: int = 0
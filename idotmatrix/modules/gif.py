@@ -1,16 +1,98 @@
-from typing import Union, List
+from typing import Iterator, Union, List, Optional, Sequence
+from .. import metrics, payloadCache, tracing
 from ..connectionManager import ConnectionManager
+from ..transferSession import TransferSession
 import io
+import os
+import time
 import logging
 from PIL import Image as PilImage
 import zlib
 
+# chunk header: chunk length (2), command (2), first/following chunk (1), gif length (4), crc (4), static
+CHUNK_HEADER = bytes([255, 255, 1, 0, 0, 255, 255, 255, 255, 255, 255, 255, 255, 5, 0, 13])
+
+
+class GifFileChunks(Sequence[bytes]):
+    """Framed chunks of a GIF file which are read from disk when they are needed.
+
+    Only the CRC32 pass reads the whole file (in blocks), so large animations are uploaded with
+    bounded memory. Iterating streams the chunks sequentially through one open file, iterFrom()
+    starts at a given chunk (used to resume a TransferSession) and indexing reads a single chunk.
+    The file must not change until the upload is done.
+    """
+
+    def __init__(
+        self,
+        file_path: str,
+        chunk_size: int = 4096,
+        crc: Optional[int] = None,
+        block_size: int = 1 << 16,
+    ) -> None:
+        """Initializes the chunks.
+
+        Args:
+            file_path (str): path to the gif file
+            chunk_size (int): size of a chunk. Defaults to 4096.
+            crc (Optional[int]): precomputed CRC32 of the file. Defaults to None (computed from the file).
+            block_size (int): read size of the CRC32 pass. Defaults to 64 KB.
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.length = os.path.getsize(file_path)
+        if crc is None:
+            crc = 0
+            with open(file_path, "rb") as file:
+                for block in iter(lambda: file.read(block_size), b""):
+                    crc = zlib.crc32(block, crc)
+        self.crc = crc
+        self._header = bytearray(CHUNK_HEADER)
+        self._header[5:9] = self.length.to_bytes(4, byteorder="little")
+        self._header[9:13] = crc.to_bytes(4, byteorder="little")
+
+    def __len__(self) -> int:
+        return (self.length + self.chunk_size - 1) // self.chunk_size
+
+    def _frame(self, index: int, chunk: bytes) -> bytes:
+        header = self._header
+        header[4] = 2 if index > 0 else 0
+        header[0:2] = (len(chunk) + len(header)).to_bytes(2, byteorder="little")
+        return bytes(header) + chunk
+
+    def __getitem__(self, index: int) -> bytes:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("chunk index out of range")
+        with open(self.file_path, "rb") as file:
+            file.seek(index * self.chunk_size)
+            return self._frame(index, file.read(self.chunk_size))
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self.iterFrom(0)
+
+    def iterFrom(self, start: int) -> Iterator[bytes]:
+        """Streams the chunks sequentially, starting with the given chunk.
+
+        Args:
+            start (int): index of the first chunk
+
+        Returns:
+            Iterator[bytes]: framed chunks
+        """
+        with open(self.file_path, "rb") as file:
+            file.seek(start * self.chunk_size)
+            for index in range(start, len(self)):
+                yield self._frame(index, file.read(self.chunk_size))
+
 
 class Gif:
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
+        # transfer session of the last upload, can be resumed with self.session.run(self.conn)
+        self.session: Optional[TransferSession] = None
 
     def _load(self, file_path: str) -> bytes:
         """Load a gif file into a byte buffer.
@@ -24,108 +106,112 @@ class Gif:
         with open(file_path, "rb") as file:
             return file.read()
 
-    def _splitIntoChunks(self, data: bytearray, chunk_size: int) -> List[bytearray]:
-        """Split the data into chunks of specified size.
+    def _splitIntoChunks(self, data: bytearray, chunk_size: int) -> List[memoryview]:
+        """Split the data into chunks of specified size without copying it.
 
         Args:
             data (bytearray): data to split into chunks
             chunk_size (int): size of the chunks
 
         Returns:
-            List[bytearray]: returns list with chunks of given data input
+            List[memoryview]: returns list with views on the chunks of given data input
         """
-        return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+        view = memoryview(data)
+        return [view[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
 
     def _createPayloads(
         self, gif_data: bytearray, chunk_size: int = 4096
-    ) -> List[bytearray]:
+    ) -> List[memoryview]:
         """Creates payloads from a GIF file.
 
+        All payloads are views on one preallocated buffer, the headers are written in place.
+
         Args:
             gif_data (bytearray): data of the gif file
             chunk_size (int): size of a chunk
 
         Returns:
-            bytearray: returns bytearray payload
+            List[memoryview]: returns the framed payloads
         """
-        # chunk header
-        header = bytearray(
-            [
-                255,
-                255,
-                1,
-                0,
-                0,
-                255,
-                255,
-                255,
-                255,
-                255,
-                255,
-                255,
-                255,
-                5,
-                0,
-                13,
-            ]
-        )
-        # split gif into chunks
-        chunks = []
-        gif_chunks = self._splitIntoChunks(gif_data, chunk_size)
-        # set gif length
-        header[5:9] = int(len(gif_data)).to_bytes(4, byteorder="little")
-        # set crc of gif
-        crc = zlib.crc32(gif_data)
-        header[9:13] = crc.to_bytes(4, byteorder="little")
-        # iterate over chunks
-        for i, chunk in enumerate(gif_chunks):
-            # starting from the second chunk, set the header to 2
-            header[4] = 2 if i > 0 else 0
-            # set chunk length in header
-            chunk_len = len(chunk) + len(header)
-            header[0:2] = chunk_len.to_bytes(2, byteorder="little")
-            # append chunk to chunk list
-            chunks.append(header + chunk)
+        with tracing.span("gif.create_payloads", size=len(gif_data)):
+            header = bytearray(CHUNK_HEADER)
+            # set gif length
+            header[5:9] = int(len(gif_data)).to_bytes(4, byteorder="little")
+            # set crc of gif
+            crc = zlib.crc32(gif_data)
+            header[9:13] = crc.to_bytes(4, byteorder="little")
+            gif_chunks = self._splitIntoChunks(gif_data, chunk_size)
+            buffer = memoryview(bytearray(len(gif_data) + len(gif_chunks) * len(header)))
+            chunks = []
+            offset = 0
+            # iterate over chunks
+            for i, chunk in enumerate(gif_chunks):
+                # starting from the second chunk, set the header to 2
+                header[4] = 2 if i > 0 else 0
+                # set chunk length in header
+                chunk_len = len(chunk) + len(header)
+                header[0:2] = chunk_len.to_bytes(2, byteorder="little")
+                # write header and chunk into the buffer
+                buffer[offset : offset + len(header)] = header
+                buffer[offset + len(header) : offset + chunk_len] = chunk
+                chunks.append(buffer[offset : offset + chunk_len])
+                offset += chunk_len
         return chunks
 
-    async def uploadUnprocessed(self, file_path: str) -> Union[bool, bytearray]:
+    async def _upload(self, payloads: Sequence[bytes]) -> bool:
+        """Sends the payloads as resumable transfer session.
+
+        Args:
+            payloads (Sequence[bytes]): payloads created by _createPayloads() or a GifFileChunks
+
+        Returns:
+            bool: True if all payloads were delivered
+        """
+        self.session = TransferSession(payloads)
+        return await self.session.run(self.conn)
+
+    async def uploadUnprocessed(
+        self, file_path: str, crc: Optional[int] = None
+    ) -> Union[bool, GifFileChunks]:
         """uploads an image without further checks and resizes.
 
+        The file is streamed from disk in 4 KB chunks instead of being loaded.
+
         Args:
             file_path (str): path to the image file
+            crc (Optional[int]): precomputed CRC32 of the file, skips the CRC32 pass when streaming. Defaults to None.
 
         Returns:
-            Union[bool, bytearray]: False if there's an error, otherwise returns bytearray payload
+            Union[bool, GifFileChunks]: False if there's an error, otherwise returns the payloads as a Sequence[bytes] which reads them from the file on access (list() it to keep them)
         """
         try:
-            gif_data = self._load(file_path)
-            data = self._createPayloads(gif_data)
             if self.conn:
                 await self.conn.connect()
-                for chunk in data:
-                    await self.conn.send(
-                        data=chunk,
-                        response=True,
-                    )
+            start = time.perf_counter()
+            with tracing.span("gif.stream_crc", crc_given=crc is not None):
+                data = GifFileChunks(file_path, crc=crc)
+            metrics.observe(
+                "idotmatrix_encode_seconds", time.perf_counter() - start, command="gif"
+            )
+            if self.conn and self.conn.address and not await self._upload(data):
+                return False
             return data
         except BaseException as error:
             self.logging.error(f"could not upload gif unprocessed: {error}")
             return False
 
-    async def uploadProcessed(
-        self, file_path: str, pixel_size: int = 32
-    ) -> Union[bool, bytearray]:
-        """uploads a file processed to make sure everything is correct before uploading to the device.
+    def _process(self, file_path: str, pixel_size: int) -> List[memoryview]:
+        """Resizes all frames of a gif file and creates its payloads.
 
         Args:
             file_path (str): path to the image file
-            pixel_size (int, optional): amount of pixels (either 16 or 32 makes sense). Defaults to 32.
+            pixel_size (int): amount of pixels per side
 
         Returns:
-            Union[bool, bytearray]: False if there's an error, otherwise returns bytearray payload
+            List[memoryview]: returns the framed payloads
         """
-        try:
-            with PilImage.open(file_path) as img:
+        with PilImage.open(file_path) as img:
+            with tracing.span("gif.decode_resize", size=pixel_size):
                 frames = []
                 try:
                     while True:
@@ -138,6 +224,7 @@ class Gif:
                         img.seek(img.tell() + 1)
                 except EOFError:
                     pass
+            with tracing.span("gif.encode", frames=len(frames)):
                 gif_buffer = io.BytesIO()
                 frames[0].save(
                     gif_buffer,
@@ -148,13 +235,45 @@ class Gif:
                     duration=img.info["duration"],
                     disposal=2,
                 )
-                gif_buffer.seek(0)
-                data = self._createPayloads(gif_buffer.getvalue())
-                if self.conn:
-                    await self.conn.connect()
-                    for chunk in data:
-                        await self.conn.send(data=chunk, response=True)
-                return data
+            gif_buffer.seek(0)
+            return self._createPayloads(gif_buffer.getvalue())
+
+    async def uploadProcessed(
+        self, file_path: str, pixel_size: int = 32
+    ) -> Union[bool, List[bytes]]:
+        """uploads a file processed to make sure everything is correct before uploading to the device.
+
+        The payloads are taken from the payload cache if one is set (see payloadCache.setPayloadCache()).
+
+        Args:
+            file_path (str): path to the image file
+            pixel_size (int, optional): amount of pixels (either 16 or 32 makes sense). Defaults to 32.
+
+        Returns:
+            Union[bool, List[bytes]]: False if there's an error, otherwise returns the payloads
+        """
+        try:
+            start = time.perf_counter()
+            cache = payloadCache.getPayloadCache()
+            data = None
+            if cache is not None:
+                key = cache.key(file_path, "gif", pixel_size, "nearest")
+                data = cache.get(key)
+            if data is None:
+                # bytes like the cached payloads, the views would pin the whole framed buffer
+                data = [bytes(payload) for payload in self._process(file_path, pixel_size)]
+                if cache is not None:
+                    cache.put(key, data)
+            metrics.observe(
+                "idotmatrix_encode_seconds",
+                time.perf_counter() - start,
+                command="gif",
+            )
+            if self.conn:
+                await self.conn.connect()
+                if self.conn.address and not await self._upload(data):
+                    return False
+            return data
         except BaseException as error:
             self.logging.error(f"could not upload gif processed: {error}")
             return False
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Optional
 from ..connectionManager import ConnectionManager
 import logging
 
@@ -8,8 +8,8 @@ class Graffiti:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setPixel(
         self, r: int, g: int, b: int, x: int, y: int
@@ -1,16 +1,24 @@
-from typing import Union, List
+from typing import Union, List, Optional
+from .. import metrics, payloadCache, tracing
 from ..connectionManager import ConnectionManager
+from ..transferSession import TransferSession
 import io
 import logging
 from PIL import Image as PilImage
 import struct
+import time
 
 
 class Image:
     logging = logging.getLogger(__name__)
+    # size of the png data inside one payload and of the header in front of it
+    chunk_size = 4096
+    header_size = 9
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
+        # transfer session of the last upload, can be resumed with self.session.run(self.conn)
+        self.session: Optional[TransferSession] = None
 
     async def setMode(self, mode: int = 1) -> Union[bool, bytearray]:
         """Enter the DIY draw mode of the iDotMatrix device.
@@ -43,17 +51,18 @@ class Image:
         with open(file_path, "rb") as file:
             return file.read()
 
-    def _splitIntoChunks(self, data: bytearray, chunk_size: int) -> List[bytearray]:
-        """Split the data into chunks of specified size.
+    def _splitIntoChunks(self, data: bytearray, chunk_size: int) -> List[memoryview]:
+        """Split the data into chunks of specified size without copying it.
 
         Args:
             data (bytearray): data to split into chunks
             chunk_size (int): size of the chunks
 
         Returns:
-            List[bytearray]: returns list with chunks of given data input
+            List[memoryview]: returns list with views on the chunks of given data input
         """
-        return [data[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
+        view = memoryview(data)
+        return [view[i : i + chunk_size] for i in range(0, len(data), chunk_size)]
 
     def _createPayloads(self, png_data: bytearray) -> bytearray:
         """Creates payloads from a PNG file.
@@ -62,20 +71,36 @@ class Image:
             png_data (bytearray): data of the png file
 
         Returns:
-            bytearray: returns bytearray payload
+            bytearray: returns bytearray payload (one preallocated buffer, headers are written in place)
         """
-        png_chunks = self._splitIntoChunks(png_data, 4096)
-        idk = len(png_data) + len(png_chunks)
-        idk_bytes = struct.pack("h", idk)  # Convert to 16-bit signed int
-        png_len_bytes = struct.pack("i", len(png_data))
-        payloads = bytearray()
-        for i, chunk in enumerate(png_chunks):
-            payload = (
-                idk_bytes + bytearray([0, 0, 2 if i > 0 else 0]) + png_len_bytes + chunk
-            )
-            payloads.extend(payload)
+        with tracing.span("image.create_payloads", size=len(png_data)):
+            png_chunks = self._splitIntoChunks(png_data, self.chunk_size)
+            idk = len(png_data) + len(png_chunks)
+            payloads = bytearray(len(png_data) + len(png_chunks) * self.header_size)
+            offset = 0
+            for i, chunk in enumerate(png_chunks):
+                struct.pack_into(
+                    "=hBBBi", payloads, offset, idk, 0, 0, 2 if i > 0 else 0, len(png_data)
+                )  # idk is a 16-bit signed int
+                offset += self.header_size
+                payloads[offset : offset + len(chunk)] = chunk
+                offset += len(chunk)
         return payloads
 
+    async def _upload(self, payloads: bytearray) -> bool:
+        """Sends the payloads as resumable transfer session, one session payload per framed chunk.
+
+        Args:
+            payloads (bytearray): payloads created by _createPayloads()
+
+        Returns:
+            bool: True if all payloads were delivered
+        """
+        self.session = TransferSession(
+            self._splitIntoChunks(payloads, self.header_size + self.chunk_size)
+        )
+        return await self.session.run(self.conn)
+
     async def uploadUnprocessed(self, file_path: str) -> Union[bool, bytearray]:
         """Uploads an image without further checks and resizes.
 
@@ -86,42 +111,77 @@ class Image:
             Union[bool, bytearray]: False if there's an error, otherwise returns bytearray payload
         """
         try:
+            start = time.perf_counter()
             png_data = self._loadPNG(file_path)
             data = self._createPayloads(png_data)
+            metrics.observe(
+                "idotmatrix_encode_seconds", time.perf_counter() - start, command="image"
+            )
             if self.conn:
                 await self.conn.connect()
-                await self.conn.send(data=data)
+                if self.conn.address and not await self._upload(data):
+                    return False
             return data
         except BaseException as error:
             self.logging.error(f"could not upload the unprocessed image: {error}")
             return False
 
+    def _process(self, file_path: str, pixel_size: int) -> bytearray:
+        """Resizes an image file to the panel and creates its payloads.
+
+        Args:
+            file_path (str): path to the image file
+            pixel_size (int): amount of pixels per side
+
+        Returns:
+            bytearray: returns bytearray payload
+        """
+        with PilImage.open(file_path) as img:
+            with tracing.span("image.decode_resize", size=pixel_size):
+                if img.size != (pixel_size, pixel_size):
+                    img = img.resize((pixel_size, pixel_size), PilImage.LANCZOS)
+                png_buffer = io.BytesIO()
+                img.save(png_buffer, format="PNG")
+            png_buffer.seek(0)
+            return self._createPayloads(png_buffer.getvalue())
+
     async def uploadProcessed(
         self, file_path: str, pixel_size: int = 32
-    ) -> Union[bool, bytearray]:
+    ) -> Union[bool, bytes]:
         """Uploads a file processed and makes sure everything is correct before uploading to the device.
 
+        The payload is taken from the payload cache if one is set (see payloadCache.setPayloadCache()).
+
         Args:
             file_path (str): path to the image file
             pixel_size (int, optional): amount of pixels (either 16 or 32 makes sense). Defaults to 32.
 
         Returns:
-            Union[bool, bytearray]: False if there's an error, otherwise returns bytearray payload
+            Union[bool, bytes]: False if there's an error, otherwise returns the payload
         """
         try:
-            with PilImage.open(file_path) as img:
-                if img.size != (pixel_size, pixel_size):
-                    img = img.resize(
-                        (pixel_size, pixel_size), PilImage.LANCZOS
-                    )
-                png_buffer = io.BytesIO()
-                img.save(png_buffer, format="PNG")
-                png_buffer.seek(0)
-                data = self._createPayloads(png_buffer.getvalue())
-                if self.conn:
-                    await self.conn.connect()
-                    await self.conn.send(data=data)
-                return data
+            start = time.perf_counter()
+            cache = payloadCache.getPayloadCache()
+            cached = None
+            if cache is not None:
+                key = cache.key(file_path, "image", pixel_size, "lanczos")
+                cached = cache.get(key)
+            if cached is not None:
+                data = cached[0]
+            else:
+                data = bytes(self._process(file_path, pixel_size))
+                if cache is not None:
+                    cache.put(key, [data])
+            metrics.observe(
+                "idotmatrix_encode_seconds",
+                time.perf_counter() - start,
+                command="image",
+            )
+            if self.conn:
+                await self.conn.connect()
+                if self.conn.address and not await self._upload(data):
+                    return False
+            return data
         except BaseException as error:
             self.logging.error(f"could not upload processed image: {error}")
             return False
@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Optional
 from ..connectionManager import ConnectionManager
 import logging
 
@@ -6,8 +6,8 @@ import logging
 class MusicSync:
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setMicType(self, type: int) -> Union[bool, bytearray]:
         """Set the microphone type. Not referenced anywhere in the iDotMatrix Android App. So not used atm.
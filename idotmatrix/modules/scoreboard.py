@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Optional
 from ..connectionManager import ConnectionManager
 import logging
 import struct
@@ -9,8 +9,8 @@ class Scoreboard:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def setMode(self, count1: int, count2: int) -> Union[bool, bytearray]:
         """Set the scoreboard of the device.
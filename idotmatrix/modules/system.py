@@ -1,7 +1,7 @@
 from ..connectionManager import ConnectionManager
 from cryptography.fernet import Fernet
 import logging
-from typing import Union
+from typing import Union, Optional
 
 
 class System:
@@ -9,8 +9,8 @@ class System:
 
     logging = logging.getLogger(__name__)
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(self, conn: Optional[ConnectionManager] = None) -> None:
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
 
     async def deleteDeviceData(self) -> bytearray:
         """Deletes the device data and resets it to defaults.
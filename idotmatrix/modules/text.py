@@ -1,6 +1,10 @@
+from .. import bitmapFont, glyphCache, metrics, tracing
+from ..glyphAtlas import GlyphAtlas
 from ..connectionManager import ConnectionManager
+from ..const import PANEL_TEXT_CELLS, TEXT_CELLS
 import logging
-from PIL import Image, ImageDraw, ImageFont
+from PIL import ImageFont
+import time
 from typing import Tuple, Optional, Union
 import zlib
 
@@ -9,14 +13,61 @@ class Text:
     """Manages text processing and packet creation for iDotMatrix devices. With help from https://github.com/8none1/idotmatrix/ :)"""
 
     logging = logging.getLogger(__name__)
-    # must be 16x32 or 8x16
+    # cell geometry, one of const.TEXT_CELLS (see setCellSize())
     image_width = 16
     image_height = 32
-    # must be x05 for 16x32 or x02 for 8x16
+    # x05 for 16x32, x02 for 8x16
     separator = b"\x05\xff\xff\xff"
 
-    def __init__(self) -> None:
-        self.conn: ConnectionManager = ConnectionManager()
+    def __init__(
+        self, conn: Optional[ConnectionManager] = None, pixel_size: Optional[int] = None
+    ) -> None:
+        """Initializes the text module.
+
+        Args:
+            conn (Optional[ConnectionManager]): connection of the device. Defaults to the shared connection.
+            pixel_size (Optional[int]): amount of pixels per side of the panel (16, 32 or 64), selects the cell size. Defaults to None (16x32 cells).
+        """
+        self.conn: ConnectionManager = conn if conn else ConnectionManager()
+        if pixel_size is not None:
+            if pixel_size not in PANEL_TEXT_CELLS:
+                raise ValueError(
+                    f"unsupported panel size {pixel_size}, use one of {list(PANEL_TEXT_CELLS)}"
+                )
+            self.setCellSize(*PANEL_TEXT_CELLS[pixel_size])
+        # precompiled glyphs, see loadAtlas()
+        self.atlas: Optional[GlyphAtlas] = None
+
+    def setCellSize(self, width: int, height: int) -> None:
+        """Selects the cell geometry the characters are rendered into.
+
+        Glyph caches, atlases and bitmap fonts keep separate tables per geometry, so Text
+        instances with different cell sizes (e.g. for a mixed fleet) do not slow each other down.
+
+        Args:
+            width (int): width of a cell in pixels
+            height (int): height of a cell in pixels (8x16, 16x32 and 32x64 are supported, 32x64 is not verified on a device yet)
+        """
+        if (width, height) not in TEXT_CELLS:
+            raise ValueError(
+                f"unsupported text cell size {width}x{height}, use one of {list(TEXT_CELLS)}"
+            )
+        self.image_width = width
+        self.image_height = height
+        self.separator = TEXT_CELLS[(width, height)]
+
+    def loadAtlas(self, path: Optional[str]) -> None:
+        """Uses a precompiled glyph atlas (see idotmatrix.glyphAtlas) instead of rasterizing glyphs.
+
+        The atlas is only used while font_path and font_size match the font it was built from,
+        characters missing from it are rasterized with the given font.
+
+        Args:
+            path (Optional[str]): path to the atlas file, None stops using the atlas
+        """
+        if self.atlas:
+            self.atlas.close()
+        self.atlas = GlyphAtlas(path) if path else None
 
     async def setMode(
         self,
@@ -29,8 +80,11 @@ class Text:
         text_color: Tuple[int, int, int] = (255, 0, 0),
         text_bg_mode: int = 0,
         text_bg_color: Tuple[int, int, int] = (0, 255, 0),
+        strip: bool = False,
+        proportional: bool = True,
     ) -> Union[bool, bytearray]:
         try:
+            start = time.perf_counter()
             data = self._buildStringPacket(
                 text_mode=text_mode,
                 speed=speed,
@@ -38,12 +92,24 @@ class Text:
                 text_color=text_color,
                 text_bg_mode=text_bg_mode,
                 text_bg_color=text_bg_color,
-                text_bitmaps=self._StringToBitmaps(
-                    text=text,
-                    font_size=font_size,
-                    font_path=font_path,
+                text_bitmaps=(
+                    self._StripToBitmaps(
+                        text=text,
+                        font_size=font_size,
+                        font_path=font_path,
+                        proportional=proportional,
+                    )
+                    if strip
+                    else self._StringToBitmaps(
+                        text=text,
+                        font_size=font_size,
+                        font_path=font_path,
+                    )
                 ),
             )
+            metrics.observe(
+                "idotmatrix_encode_seconds", time.perf_counter() - start, command="text"
+            )
             if self.conn:
                 await self.conn.connect()
                 await self.conn.send(data=data)
@@ -76,7 +142,10 @@ class Text:
         Returns:
             bytearray: _description_
         """
-        num_chars = text_bitmaps.count(self.separator)
+        # every cell has the same size, counting separators could also match bitmap data
+        num_chars = len(text_bitmaps) // (
+            len(self.separator) + (self.image_width + 7) // 8 * self.image_height
+        )
 
         text_metadata = bytearray(
             [
@@ -116,38 +185,102 @@ class Text:
                 12,  # Static footer values
             ]
         )
-        total_len = len(packet) + len(header)
-        header[:2] = total_len.to_bytes(2, byteorder="little")
-        header[5:9] = len(packet).to_bytes(4, byteorder="little")
-        header[9:13] = zlib.crc32(packet).to_bytes(4, byteorder="little")
+        with tracing.span("text.build_packet", size=len(packet)):
+            total_len = len(packet) + len(header)
+            header[:2] = total_len.to_bytes(2, byteorder="little")
+            header[5:9] = len(packet).to_bytes(4, byteorder="little")
+            header[9:13] = zlib.crc32(packet).to_bytes(4, byteorder="little")
 
         return header + packet
 
+    def _renderGlyph(self, char: str, font: ImageFont.FreeTypeFont) -> bytes:
+        """Draws a single character centered into a cell and packs it.
+
+        Args:
+            char (str): character to draw
+            font (ImageFont.FreeTypeFont): font to draw with
+
+        Returns:
+            bytes: packed bitmap of the cell
+        """
+        return glyphCache.renderGlyph(char, font, self.image_width, self.image_height)
+
     def _StringToBitmaps(
         self, text: str, font_path: Optional[str] = None, font_size: Optional[int] = 20
     ) -> bytearray:
-        """Converts text to bitmap images suitable for iDotMatrix devices."""
+        """Converts text to bitmap images suitable for iDotMatrix devices.
+
+        font_path may also point to a BDF or PCF bitmap font, which is used as is (font_size is ignored).
+        """
+        if not font_path:
+            # using open source font from https://www.fontspace.com/rain-font-f22577
+            font_path = "./fonts/Rain-DRM3.otf"
+        font = None
+        bitmap_font = (
+            bitmapFont.loadBitmapFont(font_path)
+            if bitmapFont.isBitmapFont(font_path)
+            else None
+        )
+        cache = glyphCache.getGlyphCache()
+        atlas = (
+            self.atlas if self.atlas and self.atlas.matches(font_path, font_size) else None
+        )
+        with tracing.span("text.bitmaps", chars=len(text)):
+            byte_stream = bytearray()
+            for char in text:
+                if atlas:
+                    record = atlas.glyph(char, self.image_width, self.image_height)
+                    if record is not None:
+                        byte_stream.extend(record)
+                        continue
+                if bitmap_font:
+                    byte_stream.extend(self.separator)
+                    byte_stream.extend(
+                        bitmap_font.cell(char, self.image_width, self.image_height)
+                    )
+                    continue
+                if font is None:
+                    font = glyphCache.loadFont(font_path, font_size)
+                key = (font.path, font_size, char, self.image_width, self.image_height)
+                bitmap = cache.get(key) if cache is not None else None
+                if bitmap is None:
+                    bitmap = self._renderGlyph(char, font)
+                    if cache is not None:
+                        cache.put(key, bitmap)
+                byte_stream.extend(self.separator)
+                byte_stream.extend(bitmap)
+        return byte_stream
+
+    def _StripToBitmaps(
+        self,
+        text: str,
+        font_path: Optional[str] = None,
+        font_size: Optional[int] = 20,
+        proportional: bool = True,
+    ) -> bytearray:
+        """Converts text to bitmap images by drawing the whole string once and slicing it into cells.
+
+        Unlike _StringToBitmaps() the characters keep the advances and kerning of the font (if proportional),
+        so marquees look like regular text. The device gets as many cells as the string is wide.
+        """
         if not font_path:
             # using open source font from https://www.fontspace.com/rain-font-f22577
             font_path = "./fonts/Rain-DRM3.otf"
-        font = ImageFont.truetype(font_path, font_size)
-        byte_stream = bytearray()
-        for char in text:
-            # todo make image the correct size for 16x16, 32x32 and 64x64
-            image = Image.new("1", (self.image_width, self.image_height), 0)
-            draw = ImageDraw.Draw(image)
-            _, _, text_width, text_height = draw.textbbox((0, 0), text=char, font=font)
-            text_x = (self.image_width - text_width) // 2
-            text_y = (self.image_height - text_height) // 2
-            draw.text((text_x, text_y), char, fill=1, font=font)
-            bitmap = bytearray()
-            for y in range(self.image_height):
-                for x in range(self.image_width):
-                    if x % 8 == 0:
-                        byte = 0
-                    pixel = image.getpixel((x, y))
-                    byte |= (pixel & 1) << (x % 8)
-                    if x % 8 == 7 or x == self.image_width - 1:
-                        bitmap.append(byte)
-            byte_stream.extend(self.separator + bitmap)
+        with tracing.span("text.strip", chars=len(text), proportional=proportional):
+            if bitmapFont.isBitmapFont(font_path):
+                bitmaps = bitmapFont.loadBitmapFont(font_path).renderStrip(
+                    text, self.image_width, self.image_height, proportional
+                )
+            else:
+                bitmaps = glyphCache.renderStrip(
+                    text,
+                    glyphCache.loadFont(font_path, font_size),
+                    self.image_width,
+                    self.image_height,
+                    proportional,
+                )
+            byte_stream = bytearray()
+            for bitmap in bitmaps:
+                byte_stream.extend(self.separator)
+                byte_stream.extend(bitmap)
         return byte_stream
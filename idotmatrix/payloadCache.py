@@ -0,0 +1,223 @@
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+import struct
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+
+from . import metrics
+
+# file signature of the disk tier including the format version
+MAGIC = b"IDMC\x01"
+
+
+class PayloadCache:
+    """LRU cache of ready-framed upload payloads, keyed by the content of the source file.
+
+    Image.uploadProcessed() and Gif.uploadProcessed() look up the payloads before doing any PIL
+    work, so repeated uploads of the same file only hash it. The memory tier is bounded by the
+    total size of the payloads; the optional disk tier keeps payloads across restarts and is
+    bounded the same way (least recently used files are removed first).
+    """
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        max_bytes: int = 32 * 1024 * 1024,
+        directory: Optional[str] = None,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ) -> None:
+        """Initializes the cache.
+
+        Args:
+            max_bytes (int): maximum size of the payloads kept in memory. Defaults to 32 MB.
+            directory (Optional[str]): directory of the disk tier. Defaults to None (memory only).
+            max_disk_bytes (int): maximum size of the disk tier. Defaults to 256 MB.
+        """
+        self.max_bytes = max_bytes
+        self.directory = os.path.expanduser(directory) if directory else None
+        self.max_disk_bytes = max_disk_bytes
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        self._entries: "OrderedDict[str, List[bytes]]" = OrderedDict()
+        self.size: int = 0
+        self.hits: int = 0
+        self.disk_hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    @staticmethod
+    def key(file_path: str, *parameters: Any, block_size: int = 1 << 16) -> str:
+        """Builds the cache key of a file and the parameters it is processed with.
+
+        Args:
+            file_path (str): path to the source file
+            *parameters: processing parameters, e.g. the kind of upload, pixel size and resample mode
+            block_size (int): read size while hashing. Defaults to 64 KB.
+
+        Returns:
+            str: SHA-256 of the file content followed by the parameters
+        """
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as file:
+            for block in iter(lambda: file.read(block_size), b""):
+                digest.update(block)
+        return ":".join([digest.hexdigest()] + [str(p) for p in parameters])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries or (
+            self.directory is not None and os.path.exists(self._path(key))
+        )
+
+    def get(self, key: str) -> Optional[List[bytes]]:
+        """Returns the payloads of the given key and marks them as recently used.
+
+        Args:
+            key (str): key built by key()
+
+        Returns:
+            Optional[List[bytes]]: cached payloads or None
+        """
+        payloads = self._entries.get(key)
+        if payloads is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.increment("idotmatrix_payload_cache_total", result="hit")
+            return payloads
+        payloads = self._load(key) if self.directory else None
+        if payloads is not None:
+            self.disk_hits += 1
+            metrics.increment("idotmatrix_payload_cache_total", result="disk_hit")
+            self._remember(key, payloads)
+            return payloads
+        self.misses += 1
+        metrics.increment("idotmatrix_payload_cache_total", result="miss")
+        return None
+
+    def put(self, key: str, payloads: Sequence[bytes]) -> None:
+        """Stores payloads (copies them, so views on reused buffers are fine).
+
+        Args:
+            key (str): key built by key()
+            payloads (Sequence[bytes]): framed payloads
+        """
+        payloads = [bytes(payload) for payload in payloads]
+        self._remember(key, payloads)
+        if self.directory:
+            self._store(key, payloads)
+
+    def clear(self) -> None:
+        """Removes all payloads from memory (the disk tier is kept)."""
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the counters of the cache."""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _remember(self, key: str, payloads: List[bytes]) -> None:
+        size = sum(len(payload) for payload in payloads)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self.size -= sum(len(payload) for payload in self._entries.pop(key))
+        self._entries[key] = payloads
+        self.size += size
+        while self.size > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= sum(len(payload) for payload in evicted)
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest() + ".idmc"
+        )
+
+    def _load(self, key: str) -> Optional[List[bytes]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            if not data.startswith(MAGIC):
+                raise ValueError("invalid signature")
+            offset = len(MAGIC)
+            (count,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            lengths = struct.unpack_from(f"<{count}I", data, offset)
+            offset += 4 * count
+            payloads = []
+            for length in lengths:
+                payloads.append(data[offset : offset + length])
+                offset += length
+            if offset != len(data):
+                raise ValueError("invalid length")
+        except (ValueError, struct.error) as error:
+            self.logging.warning(f"removing broken cache file {path}: {error}")
+            os.remove(path)
+            return None
+        # mark as recently used for the eviction of the disk tier
+        os.utime(path)
+        return payloads
+
+    def _store(self, key: str, payloads: List[bytes]) -> None:
+        header = MAGIC + struct.pack(
+            f"<I{len(payloads)}I", len(payloads), *(len(p) for p in payloads)
+        )
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as file:
+                file.write(header)
+                for payload in payloads:
+                    file.write(payload)
+            os.replace(temp_path, self._path(key))
+            self._trimDisk()
+        except OSError as error:
+            self.logging.error(f"could not write cache file: {error}")
+
+    def _trimDisk(self) -> None:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".idmc"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            os.remove(path)
+            total -= size
+            self.evictions += 1
+
+
+# cache used by Image.uploadProcessed() and Gif.uploadProcessed(), None disables caching
+_cache: Optional[PayloadCache] = None
+
+
+def setPayloadCache(cache: Optional[PayloadCache]) -> None:
+    """Enables caching of processed uploads.
+
+    Args:
+        cache (Optional[PayloadCache]): cache to use. None disables it.
+    """
+    global _cache
+    _cache = cache
+
+
+def getPayloadCache() -> Optional[PayloadCache]:
+    """Returns the active cache or None if caching is disabled."""
+    return _cache
@@ -0,0 +1,239 @@
+import asyncio
+import logging
+import struct
+import time
+from typing import (
+    TYPE_CHECKING,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from .connectionManager import ConnectionManager
+    from .connectionPool import ConnectionPool
+
+# file signature including the format version
+MAGIC = b"IDMR\x01"
+# record header: kind, seconds since the recording started, device index, length of the data
+_RECORD = struct.Struct("<BdHI")
+
+# record kinds
+KIND_DEVICE = 0  # data is the address of the device which gets the next free index
+KIND_PACKET = 1
+KIND_PACKET_RESPONSE = 2
+KIND_PAYLOAD = 3
+
+
+class RecordedWrite(NamedTuple):
+    """A packet or upload payload from a recording."""
+
+    timestamp: float
+    device: str
+    data: bytes
+    payload: bool
+    response: bool
+
+
+class Recorder:
+    """Writes everything a connection sends to a compact binary log.
+
+    Attach it with conn.recorder = recorder (or ConnectionPool.setRecorder()); every packet and
+    upload payload is logged with a monotonic timestamp and the address of the device once it
+    was written successfully. Play the log back with Replayer.
+    """
+
+    def __init__(self, file: Union[str, BinaryIO]) -> None:
+        """Initializes the recorder.
+
+        Args:
+            file (Union[str, BinaryIO]): path or binary file object to write the recording to
+        """
+        self._owned = isinstance(file, str)
+        self.file: BinaryIO = open(file, "wb") if isinstance(file, str) else file
+        self.file.write(MAGIC)
+        self.start = time.monotonic()
+        self.devices: Dict[str, int] = {}
+        self.records: int = 0
+
+    def record(
+        self, device: Optional[str], data: bytes, payload: bool = False, response: bool = False
+    ) -> None:
+        """Appends a sent packet or payload to the recording.
+
+        Args:
+            device (Optional[str]): address of the device
+            data (bytes): sent packet or framed payload
+            payload (bool): whether data is an upload payload. Defaults to False.
+            response (bool): whether the packet was written with response. Defaults to False.
+        """
+        timestamp = time.monotonic() - self.start
+        device = str(device)
+        index = self.devices.get(device)
+        if index is None:
+            index = self.devices[device] = len(self.devices)
+            address = device.encode("utf-8")
+            self.file.write(_RECORD.pack(KIND_DEVICE, timestamp, index, len(address)))
+            self.file.write(address)
+        if payload:
+            kind = KIND_PAYLOAD
+        else:
+            kind = KIND_PACKET_RESPONSE if response else KIND_PACKET
+        self.file.write(_RECORD.pack(kind, timestamp, index, len(data)))
+        self.file.write(data)
+        self.records += 1
+
+    def flush(self) -> None:
+        self.file.flush()
+
+    def close(self) -> None:
+        """Flushes the recording and closes the file if the recorder opened it."""
+        self.flush()
+        if self._owned:
+            self.file.close()
+
+    def __enter__(self) -> "Recorder":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def readRecording(file: Union[str, BinaryIO]) -> Iterator[RecordedWrite]:
+    """Reads a recording written by Recorder.
+
+    Args:
+        file (Union[str, BinaryIO]): path or binary file object of the recording
+
+    Returns:
+        Iterator[RecordedWrite]: recorded packets and payloads in the order they were sent
+    """
+    stream: BinaryIO = open(file, "rb") if isinstance(file, str) else file
+    try:
+        if stream.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not an idotmatrix recording")
+        devices: List[str] = []
+        while True:
+            header = stream.read(_RECORD.size)
+            if not header:
+                return
+            if len(header) < _RECORD.size:
+                raise ValueError("recording is truncated")
+            kind, timestamp, index, length = _RECORD.unpack(header)
+            data = stream.read(length)
+            if len(data) < length:
+                raise ValueError("recording is truncated")
+            if kind == KIND_DEVICE:
+                devices.append(data.decode("utf-8"))
+                continue
+            yield RecordedWrite(
+                timestamp,
+                devices[index],
+                data,
+                payload=kind == KIND_PAYLOAD,
+                response=kind == KIND_PACKET_RESPONSE,
+            )
+    finally:
+        if isinstance(file, str):
+            stream.close()
+
+
+class Replayer:
+    """Streams a recording back to one or many devices at original, scaled or maximum speed."""
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(self, recording: Union[str, BinaryIO, Sequence[RecordedWrite]]) -> None:
+        """Initializes the replayer.
+
+        Args:
+            recording (Union[str, BinaryIO, Sequence[RecordedWrite]]): path, file object or already loaded records
+        """
+        if isinstance(recording, str) or hasattr(recording, "read"):
+            recording = list(readRecording(recording))
+        self.records: Sequence[RecordedWrite] = recording
+
+    @property
+    def devices(self) -> List[str]:
+        """Addresses of the recorded devices in order of appearance."""
+        return list(dict.fromkeys(record.device for record in self.records))
+
+    @property
+    def duration(self) -> float:
+        """Duration of the recording in seconds."""
+        return self.records[-1].timestamp if self.records else 0.0
+
+    def _targets(
+        self,
+        target: Union[
+            "ConnectionManager",
+            "ConnectionPool",
+            Mapping[str, "ConnectionManager"],
+            Sequence["ConnectionManager"],
+        ],
+        device: str,
+    ) -> List["ConnectionManager"]:
+        if isinstance(target, Mapping):
+            conn = target.get(device) or target.get(device.upper())
+            return [conn] if conn else []
+        if hasattr(target, "connections"):
+            # ConnectionPool: only devices which are pooled
+            return [target.get(device)] if device in target else []
+        if isinstance(target, Sequence):
+            return list(target)
+        return [target]
+
+    async def _send(self, conn: "ConnectionManager", record: RecordedWrite) -> bool:
+        if record.payload:
+            return await conn.sendPayloads([record.data])
+        # the recording already is the coalesced and batched stream, send it unchanged
+        return await conn.sendRaw(record.data, response=record.response)
+
+    async def play(
+        self,
+        target: Union[
+            "ConnectionManager",
+            "ConnectionPool",
+            Mapping[str, "ConnectionManager"],
+            Sequence["ConnectionManager"],
+        ],
+        speed: Optional[float] = 1.0,
+    ) -> int:
+        """Sends the recording.
+
+        Args:
+            target: a single connection (receives the writes of all recorded devices), a ConnectionPool or
+                mapping of addresses to connections (writes go to the recorded device) or a list of
+                connections (every write goes to all of them)
+            speed (Optional[float]): factor of the original speed, e.g. 2.0 plays twice as fast. None sends as fast as possible. Defaults to 1.0.
+
+        Returns:
+            int: amount of writes which were sent successfully
+        """
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        sent = 0
+        for record in self.records:
+            if speed:
+                delay = start + record.timestamp / speed - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            conns = self._targets(target, record.device)
+            if not conns:
+                self.logging.warning(f"no target for recorded device {record.device}")
+                continue
+            results = await asyncio.gather(
+                *[self._send(conn, record) for conn in conns], return_exceptions=True
+            )
+            for conn, result in zip(conns, results):
+                if isinstance(result, BaseException):
+                    self.logging.error(f"could not replay to {conn.address}: {result}")
+                elif result:
+                    sent += 1
+        return sent
@@ -0,0 +1,44 @@
+import asyncio
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """Asynchronous token bucket used to limit the throughput of a device link.
+
+    Tokens are bytes. Consumers reserve their tokens immediately and sleep for the deficit,
+    so concurrent consumers are served in the order they called consume() and writes larger
+    than the bucket capacity are still possible.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None) -> None:
+        """Initializes the bucket.
+
+        Args:
+            rate (float): refill rate in bytes per second
+            capacity (Optional[float]): maximum burst in bytes. Defaults to one second worth of tokens.
+        """
+        if rate <= 0:
+            raise ValueError("TokenBucket expects parameter rate to be greater than 0")
+        self.rate: float = float(rate)
+        self.capacity: float = float(capacity) if capacity else self.rate
+        self.tokens: float = self.capacity
+        self.timestamp: float = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.timestamp) * self.rate
+        )
+        self.timestamp = now
+
+    async def consume(self, amount: int) -> None:
+        """Waits until the given amount of tokens is available and takes them.
+
+        Args:
+            amount (int): amount of tokens (bytes) to take
+        """
+        self._refill()
+        self.tokens -= amount
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
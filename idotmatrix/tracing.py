@@ -0,0 +1,206 @@
+"""Opt-in tracing of the encode and send stages of the library.
+
+Set a hook with setTraceHook() to receive a Span for every finished stage (PIL decode/resize,
+bitmap packing, payload creation, GATT writes, ...). Setting the environment variable
+IDOTMATRIX_PROFILE to "cprofile" or "tracemalloc" additionally profiles all traced stages and
+writes a report when the process exits (to IDOTMATRIX_PROFILE_OUTPUT if set, otherwise to stderr).
+The tracemalloc report lists the memory each stage allocated, grouped by stage name.
+"""
+
+import atexit
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+import logging
+import os
+import sys
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    """A finished (or running) stage of the library."""
+
+    __slots__ = ("name", "attributes", "parent", "start", "end")
+
+    def __init__(
+        self, name: str, attributes: Dict[str, Any], parent: Optional["Span"]
+    ) -> None:
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.start: float = time.perf_counter()
+        self.end: Optional[float] = None
+
+    @property
+    def duration(self) -> float:
+        """Duration of the stage in seconds (up to now if it is still running)."""
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+    def __repr__(self) -> str:
+        return f"Span({self.name!r}, {self.duration * 1000:.3f}ms, {self.attributes!r})"
+
+
+class _Profiler:
+    """Profiles all traced stages with cProfile or tracemalloc and reports at exit."""
+
+    MODES = ("cprofile", "tracemalloc")
+
+    def __init__(self, mode: str, output: Optional[str]) -> None:
+        self.mode = mode
+        self.output = output
+        self.active = 0
+        if mode == "cprofile":
+            import cProfile
+
+            self.profile = cProfile.Profile()
+        elif mode == "tracemalloc":
+            import tracemalloc
+
+            self.tracemalloc = tracemalloc
+            # snapshot taken when each running span was entered, keyed by id(span)
+            self.snapshots: Dict[int, "tracemalloc.Snapshot"] = {}
+            # span name -> source line -> [allocated bytes, allocated blocks]
+            self.allocations: Dict[str, Dict[str, List[int]]] = {}
+            self.spans: Dict[str, int] = {}
+            tracemalloc.start()
+        else:
+            raise ValueError(f"unknown IDOTMATRIX_PROFILE mode {mode!r}")
+        atexit.register(self.report)
+
+    def enter(self, span: Span) -> None:
+        self.active += 1
+        if self.mode == "cprofile":
+            if self.active == 1:
+                self.profile.enable()
+        else:
+            span.attributes["memory_before"] = self.tracemalloc.get_traced_memory()[0]
+            self.snapshots[id(span)] = self._snapshot()
+
+    def exit(self, span: Span) -> None:
+        self.active -= 1
+        if self.mode == "cprofile":
+            if self.active == 0:
+                self.profile.disable()
+        else:
+            current, peak = self.tracemalloc.get_traced_memory()
+            span.attributes["memory_allocated"] = current - span.attributes.pop(
+                "memory_before"
+            )
+            span.attributes["memory_peak"] = peak
+            before = self.snapshots.pop(id(span))
+            allocations = self.allocations.setdefault(span.name, {})
+            self.spans[span.name] = self.spans.get(span.name, 0) + 1
+            for stat in self._snapshot().compare_to(before, "lineno"):
+                if stat.size_diff or stat.count_diff:
+                    total = allocations.setdefault(str(stat.traceback), [0, 0])
+                    total[0] += stat.size_diff
+                    total[1] += stat.count_diff
+
+    def _snapshot(self) -> "tracemalloc.Snapshot":
+        # allocations of the snapshots and of the profiler itself would dominate every diff
+        return self.tracemalloc.take_snapshot().filter_traces(
+            (
+                self.tracemalloc.Filter(False, self.tracemalloc.__file__),
+                self.tracemalloc.Filter(False, __file__),
+            )
+        )
+
+    def report(self) -> None:
+        if self.mode == "cprofile":
+            if self.output:
+                self.profile.dump_stats(self.output)
+                return
+            import pstats
+
+            # not through the log, logging of the library is opt-in and the report would be lost
+            pstats.Stats(self.profile, stream=sys.stderr).sort_stats(
+                "cumulative"
+            ).print_stats(30)
+        else:
+            lines = []
+            for name, allocations in sorted(
+                self.allocations.items(),
+                key=lambda item: sum(size for size, _ in item[1].values()),
+                reverse=True,
+            ):
+                total = sum(size for size, _ in allocations.values())
+                lines.append(f"{name}: {total:+} B in {self.spans[name]} spans\n")
+                top = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)
+                for line, (size, count) in top[:10]:
+                    lines.append(f"    {line}: {size:+} B, {count:+} blocks\n")
+            report = "".join(lines)
+            if self.output:
+                with open(self.output, "w") as file:
+                    file.write(report)
+            else:
+                sys.stderr.write(report)
+
+
+def _createProfiler() -> Optional[_Profiler]:
+    """Creates the profiler requested by IDOTMATRIX_PROFILE, an unknown mode only logs a warning."""
+    mode = os.environ.get("IDOTMATRIX_PROFILE", "").lower()
+    if not mode:
+        return None
+    if mode not in _Profiler.MODES:
+        logger.warning(
+            f"ignoring unknown IDOTMATRIX_PROFILE mode {mode!r}, expected one of {', '.join(_Profiler.MODES)}"
+        )
+        return None
+    return _Profiler(mode, os.environ.get("IDOTMATRIX_PROFILE_OUTPUT"))
+
+
+_hook: Optional[Callable[[Span], None]] = None
+_current: ContextVar[Optional[Span]] = ContextVar("idotmatrix_span", default=None)
+_profiler: Optional[_Profiler] = _createProfiler()
+_NULL = nullcontext()
+
+
+def setTraceHook(hook: Optional[Callable[[Span], None]]) -> None:
+    """Sets the function which receives every finished span.
+
+    Args:
+        hook (Optional[Callable[[Span], None]]): called with the finished Span. None disables tracing.
+    """
+    global _hook
+    _hook = hook
+
+
+def enabled() -> bool:
+    return _hook is not None or _profiler is not None
+
+
+@contextmanager
+def _span(name: str, attributes: Dict[str, Any]) -> Iterator[Span]:
+    span = Span(name, attributes, _current.get())
+    token = _current.set(span)
+    if _profiler:
+        _profiler.enter(span)
+    try:
+        yield span
+    finally:
+        if _profiler:
+            _profiler.exit(span)
+        span.end = time.perf_counter()
+        _current.reset(token)
+        if _hook is not None:
+            try:
+                _hook(span)
+            except Exception as error:
+                logger.error(f"trace hook failed: {error}")
+
+
+def span(name: str, **attributes: Any):
+    """Traces the stage inside the with-block. Costs next to nothing while tracing is disabled.
+
+    Args:
+        name (str): name of the stage, e.g. "gif.create_payloads"
+        **attributes: additional information attached to the span (sizes, device, ...)
+
+    Returns:
+        context manager yielding the Span (or None if tracing is disabled)
+    """
+    if _hook is None and _profiler is None:
+        return _NULL
+    return _span(name, attributes)
@@ -0,0 +1,154 @@
+import asyncio
+from . import metrics
+import logging
+import time
+from typing import TYPE_CHECKING, Iterator, Optional, Sequence
+
+if TYPE_CHECKING:
+    from .connectionManager import ConnectionManager
+
+
+class TransferSession:
+    """Upload of framed payloads (e.g. the 4 KB chunks of a GIF) which survives link loss.
+
+    The session remembers the last fully delivered payload. If a write fails, it waits for the
+    connection to come back (the supervisor reconnects, otherwise connect() reconnects inline)
+    and resumes with the first payload which was not delivered completely. If the link was
+    re-established in between, the device has discarded the partial upload, so the session
+    restarts with the first payload (which carries the first-chunk header). The payloads are
+    iterated sequentially, so streamed sources (GifFileChunks) keep one file open; indexing is only
+    used when resuming a sequence without iterFrom().
+    """
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        payloads: Sequence[bytes],
+        restart_on_resume: bool = False,
+        max_attempts: int = 5,
+        window: Optional[int] = None,
+    ) -> None:
+        """Initializes the session.
+
+        Args:
+            payloads (Sequence[bytes]): framed payloads of the upload
+            restart_on_resume (bool): restart from the first payload after every failed write, not only after a reconnect. Defaults to False.
+            max_attempts (int): consecutive failed attempts before giving up. Defaults to 5.
+            window (Optional[int]): pipeline window, see ConnectionManager.sendPayloads(). Defaults to None.
+        """
+        self.payloads = payloads
+        self.restart_on_resume = restart_on_resume
+        self.max_attempts = max_attempts
+        self.window = window
+        # amount of payloads (and their bytes) which were delivered completely
+        self.delivered: int = 0
+        self._delivered_bytes: int = 0
+        self.resumes: int = 0
+        # bytes which had to be sent again after link loss
+        self.retransmitted: int = 0
+        # ConnectionManager.connects when the delivered payloads were sent
+        self._link: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        """Whether all payloads were delivered."""
+        return self.delivered >= len(self.payloads)
+
+    def _remaining(self) -> Iterator[bytes]:
+        """Iterates over the payloads which were not delivered yet."""
+        iterFrom = getattr(self.payloads, "iterFrom", None)
+        if iterFrom is not None:
+            yield from iterFrom(self.delivered)
+        elif self.delivered == 0:
+            yield from self.payloads
+        else:
+            for index in range(self.delivered, len(self.payloads)):
+                yield self.payloads[index]
+
+    def _resume(self, failed: Optional[bytes]) -> None:
+        self.resumes += 1
+        if failed is not None:
+            self.retransmitted += len(failed)
+        if self.restart_on_resume:
+            self._restart()
+
+    def _restart(self) -> None:
+        self.retransmitted += self._delivered_bytes
+        self.delivered = 0
+        self._delivered_bytes = 0
+
+    async def run(self, conn: "ConnectionManager") -> bool:
+        """Sends all payloads which are not delivered yet. Can be called again to resume a failed session.
+
+        Args:
+            conn (ConnectionManager): connection of the device
+
+        Returns:
+            bool: True if all payloads were delivered, False if the session gave up
+        """
+        failures = 0
+        start = time.perf_counter()
+        sent = 0
+        command = None
+        payloads: Optional[Iterator[bytes]] = None
+        async with conn.upload_lock:
+            try:
+                while not self.done:
+                    payload = None
+                    try:
+                        await conn.connect()
+                        if self._link != conn.connects:
+                            if self.delivered:
+                                self.logging.warning(
+                                    f"link to {conn.address} was re-established, restarting the upload"
+                                )
+                                self._restart()
+                                if payloads is not None:
+                                    payloads.close()
+                                    payloads = None
+                            self._link = conn.connects
+                        if payloads is None:
+                            payloads = self._remaining()
+                        payload = next(payloads)
+                        if command is None:
+                            command = metrics.commandName(payload)
+                        if not await conn.sendPayloads([payload], window=self.window):
+                            raise ConnectionError("device is not connected")
+                        if self._link != conn.connects:
+                            # reconnected while the payload was paced or sent, it went to a fresh link
+                            raise ConnectionError("link was re-established during the payload")
+                        self.delivered += 1
+                        self._delivered_bytes += len(payload)
+                        sent += len(payload)
+                        failures = 0
+                    except Exception as error:
+                        failures += 1
+                        if failures >= self.max_attempts:
+                            self.logging.error(
+                                f"giving up upload to {conn.address} after {failures} attempts at payload {self.delivered + 1}/{len(self.payloads)}: {error}"
+                            )
+                            return False
+                        metrics.increment(
+                            "idotmatrix_upload_retries_total", device=str(conn.address)
+                        )
+                        delay = conn.backoff(failures)
+                        self.logging.warning(
+                            f"upload to {conn.address} interrupted at payload {self.delivered + 1}/{len(self.payloads)}, resuming in {delay:.1f}s: {error}"
+                        )
+                        await asyncio.sleep(delay)
+                        self._resume(payload)
+                        # continue with the first payload which was not delivered
+                        if payloads is not None:
+                            payloads.close()
+                            payloads = None
+            finally:
+                if payloads is not None:
+                    payloads.close()
+        elapsed = time.perf_counter() - start
+        if command is not None and elapsed > 0:
+            labels = {"device": str(conn.address), "command": command}
+            metrics.observe("idotmatrix_upload_seconds", elapsed, **labels)
+            metrics.observe("idotmatrix_upload_bytes_per_second", sent / elapsed, **labels)
+            metrics.increment("idotmatrix_upload_chunks_total", len(self.payloads), **labels)
+        return True
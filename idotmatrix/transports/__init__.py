@@ -0,0 +1,9 @@
+from .transport import Transport
+from .bleakTransport import BleakTransport
+from .simulatedTransport import SimulatedTransport
+
+__all__ = [
+    "Transport",
+    "BleakTransport",
+    "SimulatedTransport",
+]
@@ -0,0 +1,98 @@
+from bleak import BleakClient, BleakScanner, AdvertisementData
+from bleak.backends.characteristic import BleakGATTCharacteristic
+from ..const import UUID_READ_DATA, UUID_WRITE_DATA, BLUETOOTH_DEVICE_NAME
+from .transport import Transport
+import logging
+from typing import Callable, List, Optional
+
+
+class BleakTransport(Transport):
+    """Bluetooth LE link to a device using bleak."""
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        address: str,
+        disconnected_callback: Optional[Callable[[Transport], None]] = None,
+    ) -> None:
+        super().__init__(address, disconnected_callback)
+        self.client: BleakClient = BleakClient(
+            address, disconnected_callback=lambda client: self._onDisconnect()
+        )
+        # resolved once per connection, see _resolveCharacteristic()
+        self._write_char: Optional[BleakGATTCharacteristic] = None
+
+    @staticmethod
+    async def scan() -> List[str]:
+        """Scans for iDotMatrix devices.
+
+        Returns:
+            List[str]: addresses of the found devices
+        """
+        logging.info("scanning for iDotMatrix bluetooth devices...")
+        devices = await BleakScanner.discover(return_adv=True)
+        filtered_devices: List[str] = []
+        for key, (device, adv) in devices.items():
+            if (
+                isinstance(adv, AdvertisementData)
+                and adv.local_name
+                and str(adv.local_name).startswith(BLUETOOTH_DEVICE_NAME)
+            ):
+                logging.info(f"found device {key} with name {adv.local_name}")
+                filtered_devices.append(device.address)
+        return filtered_devices
+
+    def _onDisconnect(self) -> None:
+        self._write_char = None
+        super()._onDisconnect()
+
+    def _resolveCharacteristic(self) -> None:
+        """Looks up the write characteristic and its maximum write size once per connection."""
+        self._write_char = self.client.services.get_characteristic(UUID_WRITE_DATA)
+        self.logging.debug(
+            f"using chunk size of {self._write_char.max_write_without_response_size} bytes"
+        )
+
+    @property
+    def is_connected(self) -> bool:
+        return self.client.is_connected
+
+    @property
+    def write_characteristic(self) -> Optional[BleakGATTCharacteristic]:
+        """Write characteristic of the connected device."""
+        if not self._write_char and self.client.is_connected:
+            self._resolveCharacteristic()
+        return self._write_char
+
+    @property
+    def max_write_size(self) -> int:
+        char = self.write_characteristic
+        return char.max_write_without_response_size if char else 0
+
+    async def connect(self) -> None:
+        if not self.client.is_connected:
+            self._write_char = None
+            await self.client.connect()
+        if not self._write_char:
+            self._resolveCharacteristic()
+
+    async def disconnect(self) -> None:
+        if self.client.is_connected:
+            await self.client.disconnect()
+        self._write_char = None
+
+    async def write(self, data: bytes, response: bool = False) -> None:
+        await self.client.write_gatt_char(self._write_char, data, response=response)
+
+    async def read(self) -> bytes:
+        return await self.client.read_gatt_char(UUID_READ_DATA)
+
+    async def startNotify(self, callback: Callable[[bytes], None]) -> None:
+        await self.client.start_notify(
+            UUID_READ_DATA, lambda characteristic, data: callback(bytes(data))
+        )
+
+    async def stopNotify(self) -> None:
+        if self.client.is_connected:
+            await self.client.stop_notify(UUID_READ_DATA)
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import random
+from .transport import Transport
+from typing import Callable, List, Optional
+
+
+class SimulatedTransport(Transport):
+    """In-process link which behaves like a BLE connection without any hardware.
+
+    Useful for load tests and benchmarks of the send path: the MTU, the latency of every write
+    (plus random jitter) and the rate of lost packets are configurable. Like a BLE link the writes
+    are delivered in order: every write occupies the link for its latency after the previous one
+    was delivered, so concurrent writes queue up instead of overlapping. Lost writes with response
+    raise a ConnectionError like an unacknowledged GATT write, lost writes without response
+    vanish silently. Delivered data is kept in self.writes and passed to on_write, e.g. to feed
+    a device emulator, and on_disconnect is called whenever the link goes down.
+    """
+
+    logging = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        address: str = "SIMULATED",
+        mtu: int = 244,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        drop_rate: float = 0.0,
+        connect_delay: float = 0.0,
+        on_write: Optional[Callable[[bytes], None]] = None,
+        on_disconnect: Optional[Callable[[], None]] = None,
+        seed: Optional[int] = None,
+        disconnected_callback: Optional[Callable[[Transport], None]] = None,
+    ) -> None:
+        """Initializes the simulated link.
+
+        Args:
+            address (str): address reported for the simulated device. Defaults to "SIMULATED".
+            mtu (int): maximum amount of bytes per write. Defaults to 244.
+            latency (float): seconds every write occupies the link. Defaults to 0.0.
+            jitter (float): maximum random deviation of the latency in seconds. Defaults to 0.0.
+            drop_rate (float): probability (0..1) that a write gets lost. Defaults to 0.0.
+            connect_delay (float): seconds a connect takes. Defaults to 0.0.
+            on_write (Optional[Callable[[bytes], None]]): called with every delivered write. Defaults to None.
+            on_disconnect (Optional[Callable[[], None]]): called when the link goes down, e.g. DeviceEmulator.reset. Defaults to None.
+            seed (Optional[int]): seed of the random generator for reproducible runs. Defaults to None.
+        """
+        super().__init__(address, disconnected_callback)
+        self.mtu = mtu
+        self.latency = latency
+        self.jitter = jitter
+        self.drop_rate = drop_rate
+        self.connect_delay = connect_delay
+        self.on_write = on_write
+        self.on_disconnect = on_disconnect
+        self.random = random.Random(seed)
+        self.writes: List[bytes] = []
+        self.dropped: int = 0
+        self._responses: Optional["asyncio.Queue[bytes]"] = None
+        # current value of the read characteristic (the latest response)
+        self.value: bytes = b""
+        self._notify: Optional[Callable[[bytes], None]] = None
+        self._connected = False
+        # event loop time at which the link is free again, and the delivery of the last write
+        self._deliver_at: float = 0.0
+        self._last_delivery: Optional[asyncio.Future] = None
+
+    @property
+    def responses(self) -> "asyncio.Queue[bytes]":
+        """Responses which were not delivered as notifications, returned by read() before the current value."""
+        if self._responses is None:
+            self._responses = asyncio.Queue()
+        return self._responses
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    @property
+    def max_write_size(self) -> int:
+        return self.mtu if self._connected else 0
+
+    async def connect(self) -> None:
+        if self.connect_delay:
+            await asyncio.sleep(self.connect_delay)
+        self._connected = True
+
+    def _linkDown(self) -> None:
+        self._connected = False
+        self._notify = None
+        if self.on_disconnect:
+            self.on_disconnect()
+
+    async def disconnect(self) -> None:
+        if self._connected:
+            self._linkDown()
+
+    def simulateDisconnect(self) -> None:
+        """Drops the link as if the device went out of range."""
+        if self._connected:
+            self._linkDown()
+            self._onDisconnect()
+
+    def respond(self, data: bytes) -> None:
+        """Lets the simulated device answer: as notification if subscribed, otherwise on the next read()."""
+        self.value = bytes(data)
+        if self._notify:
+            self._notify(bytes(data))
+        else:
+            self.responses.put_nowait(bytes(data))
+
+    async def startNotify(self, callback: Callable[[bytes], None]) -> None:
+        self._notify = callback
+
+    async def stopNotify(self) -> None:
+        self._notify = None
+
+    async def write(self, data: bytes, response: bool = False) -> None:
+        if not self._connected:
+            raise ConnectionError(f"simulated device {self.address} is not connected")
+        if len(data) > self.mtu:
+            raise ValueError(f"write of {len(data)} bytes exceeds the MTU of {self.mtu}")
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+        # FIFO: the write is delivered after the previous one plus its own latency
+        self._deliver_at = max(self._deliver_at, now) + delay
+        deliver_at = self._deliver_at
+        previous = self._last_delivery
+        delivery = self._last_delivery = loop.create_future()
+        # copy before yielding, the caller may reuse the buffer
+        data = bytes(data)
+        try:
+            await asyncio.sleep(deliver_at - now)
+            if previous is not None and not previous.done():
+                await asyncio.shield(previous)
+            if not self._connected:
+                raise ConnectionError(f"simulated device {self.address} disconnected")
+            if self.drop_rate and self.random.random() < self.drop_rate:
+                self.dropped += 1
+                if response:
+                    raise ConnectionError("simulated write was not acknowledged")
+                return
+            self.writes.append(data)
+            if self.on_write:
+                self.on_write(data)
+        finally:
+            if not delivery.done():
+                delivery.set_result(None)
+
+    async def read(self) -> bytes:
+        if not self.responses.empty():
+            return self.responses.get_nowait()
+        return self.value
@@ -0,0 +1,70 @@
+from typing import Callable, Optional
+
+
+class Transport:
+    """Link to a single device which the ConnectionManager sends its packets through.
+
+    Implementations have to provide connect(), disconnect(), write(), read(), is_connected
+    and max_write_size. They call disconnected_callback when the link drops unexpectedly.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        disconnected_callback: Optional[Callable[["Transport"], None]] = None,
+    ) -> None:
+        self.address: str = address
+        self.disconnected_callback: Optional[Callable[["Transport"], None]] = (
+            disconnected_callback
+        )
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether the link is currently up."""
+        raise NotImplementedError
+
+    @property
+    def max_write_size(self) -> int:
+        """Maximum amount of bytes per write (negotiated MTU), 0 if not connected."""
+        raise NotImplementedError
+
+    async def connect(self) -> None:
+        """Establishes the link."""
+        raise NotImplementedError
+
+    async def disconnect(self) -> None:
+        """Closes the link."""
+        raise NotImplementedError
+
+    async def write(self, data: bytes, response: bool = False) -> None:
+        """Writes at most max_write_size bytes to the device.
+
+        Args:
+            data (bytes): data to write
+            response (bool): whether to wait for the device to acknowledge the write. Defaults to False.
+        """
+        raise NotImplementedError
+
+    async def read(self) -> bytes:
+        """Reads the current value of the read characteristic of the device.
+
+        Returns:
+            bytes: data returned by the device
+        """
+        raise NotImplementedError
+
+    async def startNotify(self, callback: Callable[[bytes], None]) -> None:
+        """Subscribes to the notifications of the read characteristic of the device.
+
+        Args:
+            callback (Callable[[bytes], None]): called with the data of every notification
+        """
+        raise NotImplementedError
+
+    async def stopNotify(self) -> None:
+        """Unsubscribes from the notifications of the device."""
+        raise NotImplementedError
+
+    def _onDisconnect(self) -> None:
+        if self.disconnected_callback:
+            self.disconnected_callback(self)
@@ -0,0 +1,147 @@
+import asyncio
+from collections import OrderedDict
+from .const import COALESCABLE_COMMANDS, DISPLAY_MODE_COMMANDS
+import itertools
+import time
+from typing import Any, Dict, Hashable, List, Optional
+
+# priority classes of the WriteQueue, lower values are sent first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 1
+# shared kind of all commands which switch the display mode
+DISPLAY_MODE_KIND = b"mode"
+
+
+def commandKind(data: bytes) -> Optional[bytes]:
+    """Returns the kind of a command if only its latest value matters, otherwise None.
+
+    The kind consists of the command bytes 2-3 of the packet (e.g. 04 80 for the brightness).
+    Commands which switch the display mode (clock, effect, fullscreen color, scoreboard) share
+    DISPLAY_MODE_KIND, so a pending clock is replaced by a newer fullscreen color and vice versa.
+
+    Args:
+        data (bytes): packet which will be sent to the device
+
+    Returns:
+        Optional[bytes]: kind of the command or None if it must not be coalesced
+    """
+    if len(data) >= 4 and (data[2], data[3]) in COALESCABLE_COMMANDS:
+        if (data[2], data[3]) in DISPLAY_MODE_COMMANDS:
+            return DISPLAY_MODE_KIND
+        return bytes(data[2:4])
+    return None
+
+
+class WriteRequest:
+    """A packet waiting in the WriteQueue together with everyone waiting for it to be written."""
+
+    def __init__(
+        self,
+        data: bytes,
+        response: bool = False,
+        kind: Optional[bytes] = None,
+        payload: bool = False,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> None:
+        self.data = data
+        self.response = response
+        self.kind = kind
+        # framed upload payload which is sent with ConnectionManager.sendPayloads()
+        self.payload = payload
+        self.priority = priority
+        # perf_counter() timestamp of the first put(), used to measure the queue wait
+        self.enqueued = time.perf_counter()
+        self.waiters: List[asyncio.Future] = []
+
+    def resolve(self, result: Any = None, error: Optional[BaseException] = None) -> None:
+        for waiter in self.waiters:
+            if waiter.done():
+                continue
+            if error is not None:
+                waiter.set_exception(error)
+            else:
+                waiter.set_result(result)
+
+
+class WriteQueue:
+    """Outbound queue of one device which coalesces commands of the same kind (latest wins).
+
+    A pending command is replaced by a newer one of the same kind and moves to the end of the
+    queue, so it is still sent after everything queued before it (e.g. an image mode switch) and
+    the display converges on the newest state without sending stale values.
+    Requests are scheduled by priority class: interactive commands are sent before pending
+    bulk payloads, i.e. they preempt an upload at its next 4 KB payload boundary.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[int, "OrderedDict[Hashable, WriteRequest]"] = {
+            PRIORITY_INTERACTIVE: OrderedDict(),
+            PRIORITY_BULK: OrderedDict(),
+        }
+        self._available = asyncio.Event()
+        self._counter = itertools.count()
+        # amount of commands which were replaced before they were sent
+        self.coalesced: int = 0
+
+    def __len__(self) -> int:
+        return sum(len(pending) for pending in self._pending.values())
+
+    def put(
+        self,
+        data: bytes,
+        response: bool = False,
+        kind: Optional[bytes] = None,
+        payload: bool = False,
+        priority: int = PRIORITY_INTERACTIVE,
+    ) -> asyncio.Future:
+        """Queues a packet.
+
+        Args:
+            data (bytes): packet to send
+            response (bool): write with response. Defaults to False.
+            kind (Optional[bytes]): kind of the command, see commandKind(). None is never coalesced.
+            payload (bool): whether data is a framed upload payload. Defaults to False.
+            priority (int): PRIORITY_INTERACTIVE or PRIORITY_BULK. Defaults to PRIORITY_INTERACTIVE.
+
+        Returns:
+            asyncio.Future: resolves with the result of the write which finally carried the value
+        """
+        waiter = asyncio.get_running_loop().create_future()
+        pending = self._pending[priority]
+        request = pending.get(kind) if kind is not None else None
+        if request is not None:
+            request.data = data
+            request.response = request.response or response
+            pending.move_to_end(kind)
+            self.coalesced += 1
+        else:
+            request = WriteRequest(
+                data, response=response, kind=kind, payload=payload, priority=priority
+            )
+            key = kind if kind is not None else next(self._counter)
+            pending[key] = request
+        request.waiters.append(waiter)
+        self._available.set()
+        return waiter
+
+    async def get(self) -> WriteRequest:
+        """Takes the oldest pending request of the most important priority class (waits if there is none).
+
+        Returns:
+            WriteRequest: request to write
+        """
+        while not len(self):
+            self._available.clear()
+            await self._available.wait()
+        for priority in sorted(self._pending):
+            if self._pending[priority]:
+                _, request = self._pending[priority].popitem(last=False)
+                return request
+
+    def cancel(self) -> None:
+        """Cancels everyone waiting for a pending request and empties the queue."""
+        for pending in self._pending.values():
+            for request in pending.values():
+                for waiter in request.waiters:
+                    waiter.cancel()
+            pending.clear()
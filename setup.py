@@ -23,6 +23,9 @@ setup(
         "pillow",
         "cryptography",
     ],
+    extras_require={
+        "emulator": ["numpy"],
+    },
     classifiers=[
         "Development Status :: 2 - Pre-Alpha",
         "Environment :: Console",
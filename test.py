@@ -1,5 +1,6 @@
 import asyncio
 import time
+from idotmatrix import configureLogging
 from idotmatrix import ConnectionManager
 from idotmatrix import Chronograph
 from idotmatrix import Clock
@@ -20,6 +21,9 @@ from idotmatrix import Scoreboard
 from idotmatrix import Text
 
 
+configureLogging()
+
+
 async def main():
     # connect
     conn = ConnectionManager()